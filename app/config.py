@@ -1,6 +1,28 @@
+import os
+from pathlib import Path
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
 
+# uploaded files are stored through app.core.storage and served by app.routes.uploaded_files under /uploaded_files
+UPLOADED_FILES_DIRECTORY = Path('uploaded_files').resolve()
+UPLOADED_FILES_URL_PREFIX = 'uploaded_files'
+
+# 'local' keeps blobs under UPLOADED_FILES_DIRECTORY, 's3' in an S3 compatible bucket shared by every API node,
+# e.g. a local MinIO with S3_ENDPOINT_URL=http://localhost:9000
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+S3_BUCKET = os.environ.get('S3_BUCKET', 'dreamsmanager')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID')
+S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY')
+S3_REGION = os.environ.get('S3_REGION')
+# redirect reads to presigned URLs, or proxy them through the API when the bucket is not reachable by clients
+S3_PRESIGNED_READS = os.environ.get('S3_PRESIGNED_READS', 'true').lower() == 'true'
+S3_PRESIGN_EXPIRY = int(os.environ.get('S3_PRESIGN_EXPIRY', 3600))
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 25 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# uploads up to this size are hashed in memory before the store decides whether they need writing at all
+UPLOAD_SPOOL_SIZE = int(os.environ.get('UPLOAD_SPOOL_SIZE', 8 * 1024 * 1024))
+
 
 def configure_logging():
     logger.add("logs/main_file.log", colorize=True, backtrace=True, diagnose=True, format="{time} {level} {message}",
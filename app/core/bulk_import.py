@@ -0,0 +1,247 @@
+import asyncio
+import csv
+import datetime
+import os
+import tempfile
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from loguru import logger
+from app.config import MAX_UPLOAD_SIZE, UPLOAD_CHUNK_SIZE
+from app.core.database import Database
+from app.core.form import Form
+from app.core.form_validation import FormValidation
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+IMPORT_CHUNK_SIZE = 500
+MAX_STORED_ERRORS = 100
+
+
+class BulkImport:
+    """
+    Spreadsheet (CSV / XLSX) imports processed in the background.
+
+    The upload is copied to a temporary file, a job document is created in the import_job collection and the
+    rows are then read incrementally in chunks of IMPORT_CHUNK_SIZE. Every row is validated with the same
+    FormValidation.require_inputs rules as the add forms, duplicates are checked with one $in query per unique
+    field per chunk and the valid rows of a chunk are written with a single Database.insert_many_items call.
+    The job document is updated after every chunk so the dashboard can poll its progress.
+    """
+    collection_name = 'import_job'
+    tasks = set()
+
+    @staticmethod
+    async def start(request, collection: str, required_inputs: list, unique_fields: list, defaults: dict = None):
+        try:
+            form_data = await request.form()
+            file = form_data.get('file')
+            if not isinstance(file, UploadFile) or not file.filename:
+                return await Form.return_response(True, 'Validation Error', 'file is required', 'error', 'danger')
+
+            extension = os.path.splitext(file.filename)[1].lower()
+            if extension not in ['.csv', '.xlsx']:
+                return await Form.return_response(
+                    True, 'Validation Error', 'Only .csv and .xlsx files can be imported', 'error', 'danger')
+            if extension == '.xlsx' and openpyxl is None:
+                return await Form.return_response(
+                    True, 'Validation Error', 'Excel imports are not available on this server, upload a .csv file',
+                    'error', 'danger')
+
+            # other form fields (e.g. user_id of the agent importing) apply to every row
+            row_defaults = dict(defaults or {})
+            row_defaults.update({key: await BulkImport.normalise_value(value) for key, value in form_data.items()
+                                 if not isinstance(value, UploadFile)})
+
+            file_path = await BulkImport.copy_upload(file, extension)
+
+            job = {
+                'collection': collection,
+                'file_name': file.filename,
+                'status': 'queued',
+                'processed_rows': 0,
+                'inserted_rows': 0,
+                'failed_rows': 0,
+                'errors': [],
+            }
+            if not await Database.insert_one_item(BulkImport.collection_name, job):
+                os.unlink(file_path)
+                return await Form.return_response(
+                    True, 'Failed to start import', 'The import job could not be created', 'error', 'danger')
+
+            task = asyncio.create_task(BulkImport.run(job['id'], file_path, extension, collection, required_inputs,
+                                                      unique_fields, row_defaults))
+            BulkImport.tasks.add(task)
+            task.add_done_callback(BulkImport.tasks.discard)
+
+            return await Form.return_response(
+                False,
+                'Import started',
+                f"{file.filename} is being imported",
+                'success',
+                'success',
+                server_data={'job_id': job['id'], 'status': job['status']}
+            )
+        except Exception as e:
+            logger.error(f"Failed to start import: {e}")
+            return await Form.return_response(True, 'Failed to start import', str(e), 'error', 'danger')
+
+    @staticmethod
+    async def status(job_id: int):
+        try:
+            job = await Database.fetch_one_item_by_integer_id(BulkImport.collection_name, job_id)
+            if not job:
+                return await Form.return_response(
+                    True, 'Import not found', f"Import job {job_id} does not exist", 'error', 'danger')
+            return await Form.return_response(
+                False, 'Success', f"Import is {job['status']}", 'success', 'success', server_data=job)
+        except Exception as e:
+            logger.error(f"Failed to fetch import status: {e}")
+            return await Form.return_response(True, 'Failed to fetch import status', str(e), 'error', 'danger')
+
+    @staticmethod
+    async def copy_upload(file: UploadFile, extension: str) -> str:
+        """
+        The request's upload is closed once the response is sent, keep a private copy for the background job.
+        """
+        output = await run_in_threadpool(tempfile.NamedTemporaryFile, suffix=extension, delete=False)
+        size = 0
+        try:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_SIZE:
+                    raise ValueError(f"{file.filename} is larger than the {MAX_UPLOAD_SIZE // (1024 * 1024)} MB upload limit")
+                await run_in_threadpool(output.write, chunk)
+        except Exception:
+            await run_in_threadpool(output.close)
+            os.unlink(output.name)
+            raise
+        await run_in_threadpool(output.close)
+        return output.name
+
+    @staticmethod
+    async def normalise_value(value):
+        # same conversion Form.extract_form_input applies, so imported values compare equal to form values
+        if value is None:
+            return ''
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.strftime('%Y-%m-%d')
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        value = str(value).strip()
+        return int(value) if value.isdigit() else value
+
+    @staticmethod
+    def normalise_header(header) -> str:
+        return str(header or '').strip().lower().replace(' ', '_')
+
+    @staticmethod
+    def open_rows(file_path: str, extension: str):
+        """
+        Open the spreadsheet and return (row iterator, close function, total rows if known).
+        Rows are dictionaries keyed by the normalised header row.
+        """
+        if extension == '.xlsx':
+            workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+            sheet = workbook.active
+            rows = sheet.iter_rows(values_only=True)
+            headers = [BulkImport.normalise_header(header) for header in next(rows, [])]
+            total_rows = sheet.max_row - 1 if sheet.max_row else None
+            return (dict(zip(headers, row)) for row in rows), workbook.close, total_rows
+
+        handle = open(file_path, newline='', encoding='utf-8-sig')
+        reader = csv.reader(handle)
+        headers = [BulkImport.normalise_header(header) for header in next(reader, [])]
+        return (dict(zip(headers, row)) for row in reader), handle.close, None
+
+    @staticmethod
+    def next_chunk(rows) -> list:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                break
+        return chunk
+
+    @staticmethod
+    async def run(job_id: int, file_path: str, extension: str, collection: str, required_inputs: list,
+                  unique_fields: list, defaults: dict):
+        progress = {'processed_rows': 0, 'inserted_rows': 0, 'failed_rows': 0, 'errors': []}
+        close = None
+        try:
+            rows, close, total_rows = await run_in_threadpool(BulkImport.open_rows, file_path, extension)
+            await Database.update_one_item(BulkImport.collection_name, {'status': 'running', 'total_rows': total_rows},
+                                           'id', job_id, True)
+
+            seen_values = {field: set() for field in unique_fields}
+            row_number = 1
+            while True:
+                chunk = await run_in_threadpool(BulkImport.next_chunk, rows)
+                if not chunk:
+                    break
+
+                candidates = []
+                for row in chunk:
+                    row_number += 1
+                    values = {key: await BulkImport.normalise_value(value) for key, value in row.items() if key}
+                    if all(value == '' for value in values.values()):
+                        continue
+                    item = dict(defaults)
+                    item.update(values)
+                    progress['processed_rows'] += 1
+                    validation_message = await FormValidation.require_inputs(item, required_inputs)
+                    if validation_message != 'valid_inputs':
+                        await BulkImport.record_error(progress, row_number, validation_message['message_detail'])
+                        continue
+                    candidates.append((row_number, item))
+
+                # duplicates against the collection, one $in query per field for the whole chunk
+                existing_values = {}
+                for field in unique_fields:
+                    values = {item[field] for _, item in candidates if item.get(field, '') != ''}
+                    existing_values[field] = await Database.fetch_existing_values(collection, field, list(values))
+
+                items = []
+                item_rows = []
+                for number, item in candidates:
+                    duplicate_field = next((field for field in unique_fields if item.get(field, '') != '' and (
+                            item[field] in existing_values[field] or item[field] in seen_values[field])), None)
+                    if duplicate_field:
+                        await BulkImport.record_error(progress, number,
+                                                      f"A record with this {duplicate_field} already exists")
+                        continue
+                    for field in unique_fields:
+                        if item.get(field, '') != '':
+                            seen_values[field].add(item[field])
+                    items.append(item)
+                    item_rows.append(number)
+
+                report = await Database.insert_many_items(collection, items)
+                progress['inserted_rows'] += report['inserted_count']
+                for failure in report['failed']:
+                    await BulkImport.record_error(progress, item_rows[failure['index']], failure['error'])
+
+                await Database.update_one_item(BulkImport.collection_name, dict(progress), 'id', job_id, True)
+
+            progress['status'] = 'completed'
+        except Exception as e:
+            logger.error(f"Import job {job_id} failed: {e}")
+            progress['status'] = 'failed'
+            await BulkImport.record_error(progress, None, str(e), count_row=False)
+        finally:
+            if close:
+                await run_in_threadpool(close)
+            os.unlink(file_path)
+            await Database.update_one_item(BulkImport.collection_name, dict(progress), 'id', job_id, True)
+
+    @staticmethod
+    async def record_error(progress: dict, row_number, message: str, count_row: bool = True):
+        if count_row:
+            progress['failed_rows'] += 1
+        if len(progress['errors']) < MAX_STORED_ERRORS:
+            progress['errors'].append({'row': row_number, 'error': message})
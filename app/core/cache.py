@@ -0,0 +1,83 @@
+import json
+import time
+from collections import OrderedDict
+
+# marks a cache miss, None is a legitimate cached value
+MISSING = object()
+
+
+class ReferenceCache:
+    """
+    In-process TTL cache for small reference collections (stages, categories, products, users for display).
+
+    Collections opt in with ReferenceCache.configure(collection, ttl, max_entries). Database serves reads of
+    configured collections from here and invalidates the whole collection on every insert, update and delete,
+    so the TTL only bounds how long another worker process can serve data changed elsewhere.
+    Entries are evicted least recently used once a collection holds max_entries.
+    """
+    policies = {}
+    entries = {}
+    generations = {}
+
+    @staticmethod
+    def configure(collection: str, ttl: float = 300, max_entries: int = 1024):
+        ReferenceCache.policies[collection] = {'ttl': ttl, 'max_entries': max_entries}
+        ReferenceCache.entries.setdefault(collection, OrderedDict())
+        ReferenceCache.generations.setdefault(collection, 0)
+
+    @staticmethod
+    def is_cached(collection: str) -> bool:
+        return collection in ReferenceCache.policies
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return json.dumps(parts, sort_keys=True, default=str)
+
+    @staticmethod
+    def get(collection: str, key: str, default=MISSING):
+        entries = ReferenceCache.entries.get(collection)
+        entry = entries.get(key) if entries is not None else None
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            entries.pop(key, None)
+            return default
+        entries.move_to_end(key)
+        return value
+
+    @staticmethod
+    def set(collection: str, key: str, value, generation: int = None):
+        policy = ReferenceCache.policies.get(collection)
+        if not policy:
+            return
+        # a write invalidated the collection while the value was being loaded, it may already be stale
+        if generation is not None and generation != ReferenceCache.generations.get(collection):
+            return
+        entries = ReferenceCache.entries[collection]
+        entries[key] = (time.monotonic() + policy['ttl'], value)
+        entries.move_to_end(key)
+        while len(entries) > policy['max_entries']:
+            entries.popitem(last=False)
+
+    @staticmethod
+    def invalidate(collection: str = None):
+        collections = [collection] if collection else list(ReferenceCache.entries.keys())
+        for name in collections:
+            if name in ReferenceCache.entries:
+                ReferenceCache.entries[name].clear()
+                ReferenceCache.generations[name] += 1
+
+    @staticmethod
+    def generation(collection: str):
+        return ReferenceCache.generations.get(collection)
+
+    @staticmethod
+    async def get_or_load(collection: str, key: str, loader):
+        value = ReferenceCache.get(collection, key)
+        if value is not MISSING:
+            return value
+        generation = ReferenceCache.generation(collection)
+        value = await loader()
+        ReferenceCache.set(collection, key, value, generation)
+        return value
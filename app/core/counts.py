@@ -0,0 +1,81 @@
+import time
+from app.core.cache import ReferenceCache
+from app.core.database import Database
+
+# how long a counter is trusted before it is read from MongoDB again, this bounds how long writes made by another
+# worker process can go unnoticed
+COUNT_TTL = 30
+
+
+class Counts:
+    """
+    Totals for the dashboard cards and paginated reports without a count_documents scan on every page view.
+
+    Unfiltered totals come from estimated_document_count, which reads the collection metadata. Totals for
+    filters made of plain equality conditions (e.g. agents excluding {'default_role': 'root'}) are counted once
+    and then kept current from the Database change hooks: an insert, update or delete adds or removes the document
+    from every counter whose filter it matches. Counters expire after COUNT_TTL seconds as a fallback, and filters
+    with operators or regexes (e.g. searches) are always counted with count_documents.
+    """
+    counters = {}
+    generations = {}
+
+    @staticmethod
+    async def count(collection: str, query_list_of_dictionaries: list = None,
+                    exclude_list_of_dictionaries: list = None) -> int:
+        query_list_of_dictionaries = query_list_of_dictionaries or []
+        exclude_list_of_dictionaries = exclude_list_of_dictionaries or []
+        if not Counts.is_materialisable(query_list_of_dictionaries + exclude_list_of_dictionaries):
+            return await Database.count_items(collection, query_list_of_dictionaries, exclude_list_of_dictionaries)
+
+        key = ReferenceCache.make_key(query_list_of_dictionaries, exclude_list_of_dictionaries)
+        counter = Counts.counters.get(collection, {}).get(key)
+        if counter and counter['expires_at'] >= time.monotonic():
+            return counter['value']
+
+        generation = Counts.generations.get(collection, 0)
+        if query_list_of_dictionaries or exclude_list_of_dictionaries:
+            value = await Database.count_items(collection, query_list_of_dictionaries, exclude_list_of_dictionaries)
+        else:
+            value = await Database.estimated_count(collection)
+
+        # a write landed while counting, the value may or may not include it so don't keep it
+        if generation == Counts.generations.get(collection, 0):
+            Counts.counters.setdefault(collection, {})[key] = {
+                'value': value,
+                'expires_at': time.monotonic() + COUNT_TTL,
+                'query': query_list_of_dictionaries,
+                'exclude': exclude_list_of_dictionaries,
+            }
+        return value
+
+    @staticmethod
+    def is_materialisable(conditions: list) -> bool:
+        return all('.' not in field and not field.startswith('$') and
+                   isinstance(value, (str, int, float, bool, type(None)))
+                   for condition in conditions for field, value in condition.items())
+
+    @staticmethod
+    def matches(item: dict, query_list_of_dictionaries: list, exclude_list_of_dictionaries: list) -> bool:
+        if item is None:
+            return False
+
+        def matches_condition(condition):
+            return all(item.get(field) == value for field, value in condition.items())
+
+        if query_list_of_dictionaries and not any(map(matches_condition, query_list_of_dictionaries)):
+            return False
+        return not any(map(matches_condition, exclude_list_of_dictionaries))
+
+    @staticmethod
+    def apply_change(collection: str, before: dict = None, after: dict = None):
+        """
+        Database change hook, moves the document in or out of each counter of the collection.
+        """
+        Counts.generations[collection] = Counts.generations.get(collection, 0) + 1
+        for counter in Counts.counters.get(collection, {}).values():
+            counter['value'] += Counts.matches(after, counter['query'], counter['exclude']) - \
+                                Counts.matches(before, counter['query'], counter['exclude'])
+
+
+Database.change_hooks.append(Counts.apply_change)
@@ -0,0 +1,207 @@
+import asyncio
+import time
+from collections import deque
+from loguru import logger
+from app.core.counts import Counts
+from app.core.database import Database
+
+DASHBOARD_LATEST_SIZE = 10
+# the summary is rebuilt from MongoDB this often, picking up writes made by other worker processes
+DASHBOARD_REFRESH_INTERVAL = 300
+
+
+class DashboardSummary:
+    """
+    In-memory summary behind /dashboard/summary, kept current from the Database change hooks.
+
+    Each registered section (e.g. 'participants') holds the collection total, a count per value of every
+    group_by column (per agent, per stage) and a ring buffer of the latest DASHBOARD_LATEST_SIZE items.
+    Sections registered with a label_column also keep an id -> label map, which the other sections use to name
+    their groups and latest items, e.g. group_by={'agent': ('user_id', 'agents')} labels user_id with the agents
+    section's fullname. Inserts, updates and deletes adjust the section in place, so serving the summary never
+    queries MongoDB; a full rebuild runs at startup and every DASHBOARD_REFRESH_INTERVAL seconds.
+    """
+    sections = {}
+    state = {}
+    generations = {}
+    refreshed_at = None
+    task = None
+
+    @staticmethod
+    def register(section: str, collection: str, latest_columns: list, group_by: dict = None,
+                 exclude_list_of_dictionaries: list = None, label_column: str = None):
+        DashboardSummary.sections[section] = {
+            'collection': collection,
+            'latest_columns': list(latest_columns),
+            'group_by': dict(group_by or {}),
+            'exclude': list(exclude_list_of_dictionaries or []),
+            'label_column': label_column,
+        }
+        DashboardSummary.state[section] = DashboardSummary.empty_state(section)
+
+    @staticmethod
+    def empty_state(section: str) -> dict:
+        return {
+            'total': 0,
+            'groups': {group: {} for group in DashboardSummary.sections[section]['group_by']},
+            'latest': deque(maxlen=DASHBOARD_LATEST_SIZE),
+            'labels': {},
+        }
+
+    @staticmethod
+    def group_key(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+
+    @staticmethod
+    def latest_entry(section: str, item: dict) -> dict:
+        return {column: item[column] for column in DashboardSummary.sections[section]['latest_columns']
+                if column in item}
+
+    @staticmethod
+    async def rebuild_section(section: str):
+        spec = DashboardSummary.sections[section]
+        collection = spec['collection']
+        generation = DashboardSummary.generations.get(collection, 0)
+
+        projection = {column: 1 for column in spec['latest_columns']}
+        projection.setdefault('_id', 0)
+        facet = {
+            'total': [{'$count': 'count'}],
+            'latest': [{'$sort': {'id': -1}}, {'$limit': DASHBOARD_LATEST_SIZE}, {'$project': projection}],
+        }
+        for group, (column, _) in spec['group_by'].items():
+            facet[group] = [{'$group': {'_id': f"${column}", 'count': {'$sum': 1}}}]
+        query = {'$nor': spec['exclude']} if spec['exclude'] else {}
+        result = await Database.aggregate(collection, [{'$match': query}, {'$facet': facet}])
+        if not result:
+            return
+
+        labels = None
+        if spec['label_column']:
+            labels = await Database.aggregate(collection, [{'$project': {'_id': 0, 'id': 1,
+                                                                         spec['label_column']: 1}}])
+
+        # a write landed while aggregating and was already applied incrementally, keep that state until next time
+        if generation != DashboardSummary.generations.get(collection, 0):
+            logger.info(f"Dashboard summary rebuild of {section} skipped, {collection} changed meanwhile")
+            return
+
+        facet = result[0]
+        state = DashboardSummary.empty_state(section)
+        state['total'] = facet['total'][0]['count'] if facet.get('total') else 0
+        state['latest'].extend(facet.get('latest', []))
+        for group in spec['group_by']:
+            state['groups'][group] = {DashboardSummary.group_key(entry['_id']): entry['count']
+                                      for entry in facet.get(group, [])}
+        state['labels'] = {DashboardSummary.group_key(item.get('id')): item.get(spec['label_column'])
+                           for item in labels or []}
+        DashboardSummary.state[section] = state
+
+    @staticmethod
+    async def rebuild():
+        for section in DashboardSummary.sections:
+            try:
+                await DashboardSummary.rebuild_section(section)
+            except Exception as e:
+                logger.error(f"Error in DashboardSummary.rebuild for {section}: {e}")
+        DashboardSummary.refreshed_at = time.time()
+
+    @staticmethod
+    def apply_change(collection: str, before: dict = None, after: dict = None):
+        """
+        Database change hook, moves the document in or out of the totals, groups and latest items.
+        """
+        DashboardSummary.generations[collection] = DashboardSummary.generations.get(collection, 0) + 1
+        for section, spec in DashboardSummary.sections.items():
+            if spec['collection'] != collection:
+                continue
+            state = DashboardSummary.state[section]
+
+            if spec['label_column']:
+                if before:
+                    state['labels'].pop(DashboardSummary.group_key(before.get('id')), None)
+                if after:
+                    state['labels'][DashboardSummary.group_key(after.get('id'))] = after.get(spec['label_column'])
+
+            was_counted = Counts.matches(before, [], spec['exclude'])
+            is_counted = Counts.matches(after, [], spec['exclude'])
+            state['total'] += is_counted - was_counted
+            for group, (column, _) in spec['group_by'].items():
+                counts = state['groups'][group]
+                if was_counted:
+                    key = DashboardSummary.group_key(before.get(column))
+                    counts[key] = counts.get(key, 0) - 1
+                    if counts[key] <= 0:
+                        counts.pop(key)
+                if is_counted:
+                    key = DashboardSummary.group_key(after.get(column))
+                    counts[key] = counts.get(key, 0) + 1
+
+            latest = state['latest']
+            item_id = (after or before).get('id')
+            position = next((index for index, entry in enumerate(latest) if entry.get('id') == item_id), None)
+            if position is not None:
+                if is_counted:
+                    latest[position] = DashboardSummary.latest_entry(section, after)
+                else:
+                    # the buffer stays one short until the next rebuild
+                    del latest[position]
+            elif is_counted and item_id is not None and (not latest or item_id > latest[0].get('id', 0)):
+                latest.appendleft(DashboardSummary.latest_entry(section, after))
+
+    @staticmethod
+    def labels(section: str) -> dict:
+        state = DashboardSummary.state.get(section)
+        return state['labels'] if state else {}
+
+    @staticmethod
+    async def summary() -> dict:
+        sections = {}
+        for section, spec in DashboardSummary.sections.items():
+            state = DashboardSummary.state[section]
+            latest = await Database.format_items_to_be_returned(list(state['latest']))
+            summary = {'total': state['total']}
+            for group, (column, label_section) in spec['group_by'].items():
+                labels = DashboardSummary.labels(label_section)
+                for item in latest:
+                    item[group] = labels.get(DashboardSummary.group_key(item.get(column)), '---')
+                summary[f"by_{group}"] = [
+                    {'id': key, 'label': labels.get(key, '---'), 'count': count}
+                    for key, count in sorted(state['groups'][group].items(), key=lambda entry: -entry[1])
+                ]
+            summary['latest'] = latest
+            sections[section] = summary
+        return {'sections': sections, 'refreshed_at': DashboardSummary.refreshed_at}
+
+    @staticmethod
+    async def refresh():
+        while True:
+            try:
+                await asyncio.sleep(DASHBOARD_REFRESH_INTERVAL)
+                await DashboardSummary.rebuild()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in DashboardSummary.refresh: {e}")
+
+    @staticmethod
+    async def start():
+        await DashboardSummary.rebuild()
+        if DashboardSummary.task is None or DashboardSummary.task.done():
+            DashboardSummary.task = asyncio.create_task(DashboardSummary.refresh())
+
+    @staticmethod
+    async def stop():
+        if DashboardSummary.task is not None:
+            DashboardSummary.task.cancel()
+            try:
+                await DashboardSummary.task
+            except asyncio.CancelledError:
+                pass
+            DashboardSummary.task = None
+
+
+Database.change_hooks.append(DashboardSummary.apply_change)
@@ -1,8 +1,11 @@
 import motor.motor_asyncio
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 from app.core.dateFunctions import DateFunctions
+from app.core.cache import ReferenceCache, MISSING
 from pprint import pprint
-import re
+import time
 from typing import List, Dict, Any
 from loguru import logger
 
@@ -14,6 +17,20 @@ class Database:
     database_name = 'dreamsmanager'
     client = motor.motor_asyncio.AsyncIOMotorClient("mongodb://localhost:27011/")
 
+    # process level registry of collections known to exist and their reusable collection handles
+    known_collections = set()
+    collection_objects = {}
+
+    # callables (collection_name, item) that may add derived fields to an item before it is inserted or $set,
+    # e.g. Search keeps its normalised <field>_search prefixes current through here
+    write_hooks = []
+    # callables (collection_name, before, after) run once a write has succeeded, before is None for inserts and
+    # after is None for deletes, e.g. Counts adjusts its materialised counters through here
+    change_hooks = []
+    # collection -> derived fields that are kept out of every read unless a projection asks for them by name,
+    # e.g. the <field>_search arrays maintained by Search
+    hidden_fields = {}
+
     @staticmethod
     async def connection():
         return Database.client
@@ -29,13 +46,27 @@ class Database:
             logger.error(f"Database is not running, Error in database is_live with message: {e}")
         return False
 
+    @staticmethod
+    async def warm_collection_registry():
+        try:
+            client = await Database.connection()
+            database = client[Database.database_name]
+            Database.known_collections.update(await database.list_collection_names())
+            return True
+        except Exception as e:
+            logger.error(f"Error in warm_collection_registry: {e}")
+            return False
+
     @staticmethod
     async def create_collection_if_not_exists(collection: str):
         try:
+            if collection in Database.known_collections:
+                return True
             client = await Database.connection()
             database = client[Database.database_name]
             if collection not in await database.list_collection_names():
                 await database.create_collection(collection)
+            Database.known_collections.add(collection)
             return True
         except Exception as e:
             logger.error(f"Error in create_collection_if_not_exists: {e}")
@@ -44,21 +75,35 @@ class Database:
     @staticmethod
     async def create_collection_object(collection: str):
         try:
-            await Database.create_collection_if_not_exists(collection)
+            collection_object = Database.collection_objects.get(collection)
+            if collection_object is not None:
+                return collection_object
+            collection_exists = await Database.create_collection_if_not_exists(collection)
             client = await Database.connection()
             database = client[Database.database_name]
-            return database[collection]
+            collection_object = database[collection]
+            if collection_exists:
+                Database.collection_objects[collection] = collection_object
+            return collection_object
         except Exception as e:
             logger.error(f"Error in create_collection_object: {e}")
             return None
 
     @staticmethod
-    async def format_item_to_be_returned(item):
+    async def format_item_to_be_returned(item, now: float = None, time_elapsed: bool = True):
         try:
             if item:
                 item = dict(item)
-                item["_id"] = str(item["_id"])
-                item['time_elapsed'] = await DateFunctions.time_elapsed(item['date_created']['timestamp'])
+                if "_id" in item:
+                    item["_id"] = str(item["_id"])
+                if time_elapsed:
+                    now = now if now is not None else time.time()
+                    try:
+                        epoch = DateFunctions.item_epoch(item.get('date_created'))
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        # a malformed stored timestamp only loses its time_elapsed, not the whole row
+                        epoch = None
+                    item['time_elapsed'] = DateFunctions.elapsed_since(epoch, now) if epoch is not None else ''
                 return item
             return item
         except Exception as e:
@@ -66,55 +111,144 @@ class Database:
         return False
 
     @staticmethod
-    async def fetch_one_item_by_id(collection: str, object_id: str):
+    async def format_items_to_be_returned(items: list, time_elapsed: bool = True):
+        """
+        Format a batch of items against a single "now", pass time_elapsed=False for internal lookups
+        that never display it.
+        """
+        now = time.time()
+        return [await Database.format_item_to_be_returned(item, now, time_elapsed) for item in items]
+
+    @staticmethod
+    async def fetch_one_item_by_id(collection: str, object_id: str, projection: dict = None):
         try:
-            return await Database.fetch_one_item(collection, [{'_id': ObjectId(object_id)}])
+            return await Database.fetch_one_item(collection, [{'_id': ObjectId(object_id)}], projection=projection)
         except Exception as e:
             logger.error(f"Error in fetch_one_item_by_id: {e}")
             return False
 
     @staticmethod
-    async def fetch_one_item_by_integer_id(collection: str, id: int):
+    async def fetch_one_item_by_integer_id(collection: str, id: int, projection: dict = None):
         try:
-            return await Database.fetch_one_item(collection, [{'id': int(id)}])
+            return await Database.fetch_one_item(collection, [{'id': int(id)}], projection=projection)
         except Exception as e:
             logger.error(f"Error in fetch_one_item_by_id: {e}")
             return False
 
     @staticmethod
-    async def fetch_one_item(collection: str, query_list_of_dictionaries: list = None):
+    async def fetch_one_item(collection: str, query_list_of_dictionaries: list = None, time_elapsed: bool = True,
+                             projection: dict = None):
         try:
             collection = await Database.create_collection_object(collection)
             if collection is None:
                 return False
+            projection = Database.read_projection(collection.name, projection)
             query = {"$or": query_list_of_dictionaries} if query_list_of_dictionaries else {}
-            item = await collection.find(query).sort("id", -1).limit(1).to_list(1)
-            return await Database.format_item_to_be_returned(item[0]) if item else None
+            item = await collection.find(query, projection).sort("id", -1).limit(1).to_list(1)
+            return await Database.format_item_to_be_returned(item[0], time_elapsed=time_elapsed) if item else None
         except Exception as e:
             logger.error(f"Error in fetch_one_item: {e}")
             return False
 
     @staticmethod
     async def fetch_many_items(collection: str, query_list_of_dictionaries: list = None, and_query: bool = False,
-                               exclude_list_of_dictionaries: list = None, limit: int = None):
+                               exclude_list_of_dictionaries: list = None, limit: int = None,
+                               time_elapsed: bool = True, projection: dict = None):
         try:
             collection = await Database.create_collection_object(collection)
             if collection is None:
                 return []
+            projection = Database.read_projection(collection.name, projection)
             query = {}
             if query_list_of_dictionaries:
                 query["$and" if and_query else "$or"] = query_list_of_dictionaries
             if exclude_list_of_dictionaries:
                 query["$nor"] = exclude_list_of_dictionaries
-            cursor = collection.find(query).sort("id", -1)
+            cursor = collection.find(query, projection).sort("id", -1)
             if limit:
                 cursor = cursor.limit(limit)
-            items = [await Database.format_item_to_be_returned(item) for item in await cursor.to_list(None)]
-            return items
+            if ReferenceCache.is_cached(collection.name):
+                cache_key = ReferenceCache.make_key('fetch_many_items', query, limit, projection)
+                items = await ReferenceCache.get_or_load(collection.name, cache_key, lambda: cursor.to_list(None))
+            else:
+                items = await cursor.to_list(None)
+            return await Database.format_items_to_be_returned(items, time_elapsed)
         except Exception as e:
             logger.error(f"Error in fetch_many_items: {e}")
             return []
 
+    @staticmethod
+    async def stream_items(collection: str, batch_size: int = 500, query_list_of_dictionaries: list = None,
+                           exclude_list_of_dictionaries: list = None, projection: dict = None):
+        """
+        Iterate over a whole collection in batches of batch_size items, newest first, without loading it
+        into memory. Yields lists of formatted items.
+        """
+        collection = await Database.create_collection_object(collection)
+        if collection is None:
+            return
+        projection = Database.read_projection(collection.name, projection)
+        query = {"$or": query_list_of_dictionaries} if query_list_of_dictionaries else {}
+        if exclude_list_of_dictionaries:
+            query["$nor"] = exclude_list_of_dictionaries
+        cursor = collection.find(query, projection).sort("id", -1).batch_size(batch_size)
+        batch = []
+        async for item in cursor:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield await Database.format_items_to_be_returned(batch, time_elapsed=False)
+                batch = []
+        if batch:
+            yield await Database.format_items_to_be_returned(batch, time_elapsed=False)
+
+    @staticmethod
+    async def fetch_many_items_by_integer_ids(collection: str, ids: list, projection: dict = None):
+        try:
+            collection = await Database.create_collection_object(collection)
+            if collection is None:
+                return []
+            projection = Database.read_projection(collection.name, projection)
+            ids = list({int(id) for id in ids})
+            if not ids:
+                return []
+            if not ReferenceCache.is_cached(collection.name):
+                return await collection.find({'id': {'$in': ids}}, projection).to_list(None)
+
+            # serve what we can from the reference cache and only query the ids it does not hold
+            projection_key = ReferenceCache.make_key(projection)
+            items = []
+            missing_ids = []
+            for id in ids:
+                item = ReferenceCache.get(collection.name, f"id:{id}:{projection_key}")
+                if item is MISSING:
+                    missing_ids.append(id)
+                else:
+                    items.append(item)
+            if missing_ids:
+                generation = ReferenceCache.generation(collection.name)
+                for item in await collection.find({'id': {'$in': missing_ids}}, projection).to_list(None):
+                    ReferenceCache.set(collection.name, f"id:{item['id']}:{projection_key}", item, generation)
+                    items.append(item)
+            return items
+        except Exception as e:
+            logger.error(f"Error in fetch_many_items_by_integer_ids: {e}")
+            return []
+
+    @staticmethod
+    async def fetch_existing_values(collection: str, column_name: str, values: list) -> set:
+        """
+        Which of values are already stored in column_name, checked with a single $in query.
+        """
+        try:
+            collection = await Database.create_collection_object(collection)
+            if collection is None or not values:
+                return set()
+            items = await collection.find({column_name: {'$in': list(values)}}, {'_id': 0, column_name: 1}).to_list(None)
+            return {item[column_name] for item in items if column_name in item}
+        except Exception as e:
+            logger.error(f"Error in fetch_existing_values: {e}")
+            return set()
+
     @staticmethod
     async def insert_one_item(collection: str, item: dict):
         try:
@@ -123,11 +257,87 @@ class Database:
                 return False
             next_id = await Database.get_next_sequence(collection.name)
             item['id'] = next_id
+            Database.run_write_hooks(collection.name, item)
             return await Database._insert_item(collection, item)
         except Exception as e:
             logger.error(f"Error in insert_one_item: {e}")
             return False
 
+    @staticmethod
+    async def insert_many_items(collection: str, items: list):
+        """
+        Insert a batch of items with one sequence reservation and one unordered insert_many.
+        Returns the ids that were inserted and, for rows that were not, their index in items and the error.
+        """
+        report = {'inserted_ids': [], 'inserted_count': 0, 'failed': []}
+        try:
+            if not items:
+                return report
+            collection = await Database.create_collection_object(collection)
+            if collection is None:
+                report['failed'] = [{'index': index, 'error': 'Collection is not available'} for index in
+                                    range(len(items))]
+                return report
+
+            first_id = await Database.reserve_sequence_block(collection.name, len(items))
+            if first_id is None:
+                report['failed'] = [{'index': index, 'error': 'Failed to reserve ids'} for index in range(len(items))]
+                return report
+
+            # one timestamp for the whole batch, rows carrying a manual_date_created still get their own
+            batch_date_created = (await DateFunctions.add_current_timestamp({}))['date_created']
+            for offset, item in enumerate(items):
+                item['id'] = first_id + offset
+                await Database._add_date_created(item, batch_date_created)
+                Database.run_write_hooks(collection.name, item)
+
+            failed_indexes = set()
+            try:
+                await collection.insert_many(items, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get('writeErrors', []):
+                    failed_indexes.add(error['index'])
+                    report['failed'].append({'index': error['index'], 'error': error.get('errmsg', '')})
+
+            report['inserted_ids'] = [item['id'] for index, item in enumerate(items) if index not in failed_indexes]
+            report['inserted_count'] = len(report['inserted_ids'])
+            ReferenceCache.invalidate(collection.name)
+            for index, item in enumerate(items):
+                if index not in failed_indexes:
+                    Database.run_change_hooks(collection.name, None, item)
+            return report
+        except Exception as e:
+            logger.error(f"Error in insert_many_items: {e}")
+            inserted = set(report['inserted_ids'])
+            report['failed'] = [{'index': index, 'error': str(e)} for index, item in enumerate(items)
+                                if item.get('id') not in inserted]
+            return report
+
+    @staticmethod
+    def read_projection(collection_name: str, projection: dict = None):
+        """
+        The projection to read a collection with, hiding its hidden_fields unless projection only includes fields.
+        """
+        hidden = Database.hidden_fields.get(collection_name)
+        if not hidden:
+            return projection
+        if projection and any(value not in (0, False) for key, value in projection.items() if key != '_id'):
+            return projection
+        return {**{field: 0 for field in hidden}, **(projection or {})}
+
+    @staticmethod
+    def run_write_hooks(collection_name: str, item: dict):
+        for hook in Database.write_hooks:
+            hook(collection_name, item)
+
+    @staticmethod
+    def run_change_hooks(collection_name: str, before: dict = None, after: dict = None):
+        for hook in Database.change_hooks:
+            try:
+                hook(collection_name, before, after)
+            except Exception as e:
+                logger.error(f"Error in change hook {getattr(hook, '__qualname__', hook)}: {e}")
+
     @staticmethod
     async def get_next_sequence(collection_name):
         try:
@@ -143,16 +353,43 @@ class Database:
             logger.error(f"Error in get_next_sequence: {e}")
             return None
 
+    @staticmethod
+    async def reserve_sequence_block(collection_name, count: int):
+        """
+        Reserve count consecutive ids with a single $inc and return the first one.
+        """
+        try:
+            counter_collection = await Database.create_collection_object('counters')
+            result = await counter_collection.find_one_and_update(
+                {'_id': collection_name},
+                {'$inc': {'seq': count}},
+                return_document=True,
+                upsert=True
+            )
+            return result['seq'] - count + 1
+        except Exception as e:
+            logger.error(f"Error in reserve_sequence_block: {e}")
+            return None
+
+    @staticmethod
+    async def _add_date_created(item, date_created: dict = None):
+        if 'manual_date_created' in item and item['manual_date_created']:
+            manual_date_created = item.pop('manual_date_created')
+            item['date_created'] = manual_date_created
+            return await DateFunctions.add_payback_timestamp(item, manual_date_created, 'date_created')
+        if date_created:
+            item['date_created'] = dict(date_created)
+            return item
+        return await DateFunctions.add_current_timestamp(item)
+
     @staticmethod
     async def _insert_item(collection, item):
         try:
-            if 'manual_date_created' in item and item['manual_date_created']:
-                date_created = item.pop('manual_date_created')
-                item['date_created'] = date_created
-                item = await DateFunctions.add_payback_timestamp(item, date_created, 'date_created')
-            else:
-                item = await DateFunctions.add_current_timestamp(item)
+            item = await Database._add_date_created(item)
             result = await collection.insert_one(item)
+            ReferenceCache.invalidate(collection.name)
+            if result.inserted_id:
+                Database.run_change_hooks(collection.name, None, item)
             return result.inserted_id if result.inserted_id else False
         except Exception as e:
             logger.error(f"Error in _insert_item: {e}")
@@ -166,9 +403,16 @@ class Database:
                 return False
             myquery = {id_column: int(id_value) if id_is_integer else id_value}
             item = await DateFunctions.add_last_updated_timestamp(item)
+            Database.run_write_hooks(collection.name, item)
             update_query = {"$set": {key: value for key, value in item.items() if key != 'id'}}
-            result = await collection.update_one(myquery, update_query)
-            return True if result else False
+            # the document as it was before the update, so change hooks can tell what changed
+            before = await collection.find_one_and_update(myquery, update_query,
+                                                          return_document=ReturnDocument.BEFORE)
+            ReferenceCache.invalidate(collection.name)
+            # as with update_one, an update that matched nothing still succeeded, there is just nothing to report
+            if before is not None:
+                Database.run_change_hooks(collection.name, before, {**before, **update_query['$set']})
+            return True
         except Exception as e:
             logger.error(f"Error in update_one_item: {e}")
             return False
@@ -181,8 +425,12 @@ class Database:
                 return False
             object_id = ObjectId(id_value)
             myquery = {'_id': object_id}
-            result = await collection.delete_one(myquery)
-            return True if result.deleted_count > 0 else False
+            deleted = await collection.find_one_and_delete(myquery)
+            ReferenceCache.invalidate(collection.name)
+            if deleted is None:
+                return False
+            Database.run_change_hooks(collection.name, deleted, None)
+            return True
         except Exception as e:
             logger.error(f"Error in delete_one_item_by_id: {e}")
             return False
@@ -190,22 +438,53 @@ class Database:
     @staticmethod
     async def fetch_many_items_paginated(collection: str, page_number: int, page_size: int,
                                          query_list_of_dictionaries: list = None,
-                                         exclude_list_of_dictionaries: list = None):
+                                         exclude_list_of_dictionaries: list = None, time_elapsed: bool = True,
+                                         projection: dict = None):
         try:
             collection = await Database.create_collection_object(collection)
             if collection is None:
                 return []
+            projection = Database.read_projection(collection.name, projection)
             skip = (page_number - 1) * page_size
             query = {"$or": query_list_of_dictionaries} if query_list_of_dictionaries else {}
             if exclude_list_of_dictionaries:
                 query["$nor"] = exclude_list_of_dictionaries
-            items = [await Database.format_item_to_be_returned(item) for item in
-                     await collection.find(query).sort("id", -1).skip(skip).limit(page_size).to_list(None)]
-            return items
+            items = await collection.find(query, projection).sort("id", -1).skip(skip).limit(page_size).to_list(None)
+            return await Database.format_items_to_be_returned(items, time_elapsed)
         except Exception as e:
             logger.error(f"Error in fetch_many_items_paginated: {e}")
             return []
 
+    @staticmethod
+    async def fetch_many_items_keyset(collection: str, page_size: int, after_id: int = None, before_id: int = None,
+                                      query_list_of_dictionaries: list = None,
+                                      exclude_list_of_dictionaries: list = None, time_elapsed: bool = True,
+                                      projection: dict = None):
+        """
+        Keyset pagination on the integer id sequence, newest first: the items older than after_id, or the items
+        just newer than before_id. Unlike skip(), the cost does not grow with how deep the page is.
+        """
+        try:
+            collection = await Database.create_collection_object(collection)
+            if collection is None:
+                return []
+            projection = Database.read_projection(collection.name, projection)
+            query = {"$or": query_list_of_dictionaries} if query_list_of_dictionaries else {}
+            if exclude_list_of_dictionaries:
+                query["$nor"] = exclude_list_of_dictionaries
+            if before_id is not None:
+                query['id'] = {'$gt': int(before_id)}
+                items = await collection.find(query, projection).sort("id", 1).limit(page_size).to_list(None)
+                items.reverse()
+            else:
+                if after_id is not None:
+                    query['id'] = {'$lt': int(after_id)}
+                items = await collection.find(query, projection).sort("id", -1).limit(page_size).to_list(None)
+            return await Database.format_items_to_be_returned(items, time_elapsed)
+        except Exception as e:
+            logger.error(f"Error in fetch_many_items_keyset: {e}")
+            return []
+
     @staticmethod
     async def count_items(collection: str, query_list_of_dictionaries: list = None,
                           exclude_list_of_dictionaries: list = None, ):
@@ -223,16 +502,26 @@ class Database:
             return 0
 
     @staticmethod
-    async def search_by_column(collection: str, column_name: str, search_text: str):
+    async def estimated_count(collection: str):
+        """
+        Total number of documents from the collection metadata, no documents or index keys are read.
+        """
+        try:
+            collection = await Database.create_collection_object(collection)
+            if collection is None:
+                return 0
+            return max(await collection.estimated_document_count(), 0)
+        except Exception as e:
+            logger.error(f"Error in estimated_count: {e}")
+            return 0
+
+    @staticmethod
+    async def aggregate(collection: str, pipeline: list):
         try:
             collection = await Database.create_collection_object(collection)
             if collection is None:
                 return []
-            regex_pattern = re.compile(f'.*{re.escape(search_text)}.*', re.IGNORECASE)
-            query = {column_name: {'$regex': regex_pattern}}
-            items = [await Database.format_item_to_be_returned(item) for item in
-                     await collection.find(query).sort("id", -1).to_list(None)]
-            return items
+            return await collection.aggregate(pipeline).to_list(None)
         except Exception as e:
-            logger.error(f"Error in search_by_column: {e}")
+            logger.error(f"Error in aggregate: {e}")
             return []
@@ -0,0 +1,100 @@
+import asyncio
+from contextvars import ContextVar
+from loguru import logger
+from app.core.database import Database
+
+# the loader of the request being served, set by the dataloader middleware
+current_loader = ContextVar('current_loader', default=None)
+
+
+class DataLoader:
+    """
+    Request scoped batching and memoisation of documents looked up by their integer id.
+
+    The dataloader middleware creates one loader per request, stores it on request.state.loader and makes it the
+    current_loader for everything the request awaits. load(collection, id) calls made in the same event loop
+    tick are coalesced into a single $in query per collection, and every document is kept for the rest of the
+    request, so the same user, stage or product is read from MongoDB at most once per request however many joins
+    ask for it. Collections configured with a projection (e.g. user without its password hash) are always loaded
+    through it.
+    """
+    projections = {}
+
+    def __init__(self):
+        self.results = {}
+        self.queue = {}
+        self.dispatch_scheduled = False
+        self.tasks = set()
+
+    @staticmethod
+    def configure(collection: str, projection: dict = None):
+        DataLoader.projections[collection] = projection
+
+    @staticmethod
+    def current():
+        return current_loader.get()
+
+    async def load(self, collection: str, item_id):
+        future = self.enqueue(collection, item_id)
+        return await asyncio.shield(future) if future is not None else None
+
+    async def load_many(self, collection: str, ids: list) -> list:
+        futures = [self.enqueue(collection, item_id) for item_id in ids]
+        return await asyncio.gather(*(asyncio.shield(future) if future is not None else asyncio.sleep(0)
+                                      for future in futures))
+
+    def enqueue(self, collection: str, item_id):
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return None
+
+        key = (collection, item_id)
+        future = self.results.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.results[key] = future
+            self.queue.setdefault(collection, {})[item_id] = future
+            if not self.dispatch_scheduled:
+                # runs once the coroutines that are ready in this tick have queued their ids
+                self.dispatch_scheduled = True
+                asyncio.get_running_loop().call_soon(self.dispatch)
+        return future
+
+    def dispatch(self):
+        self.dispatch_scheduled = False
+        queue, self.queue = self.queue, {}
+        for collection, futures in queue.items():
+            task = asyncio.ensure_future(self.fetch(collection, futures))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def fetch(self, collection: str, futures: dict):
+        try:
+            items = await Database.fetch_many_items_by_integer_ids(collection, list(futures),
+                                                                  DataLoader.projections.get(collection))
+            index = {item.get('id'): item for item in items}
+            for item_id, future in futures.items():
+                if not future.done():
+                    future.set_result(index.get(item_id))
+        except Exception as e:
+            logger.error(f"Error in DataLoader.fetch for {collection}: {e}")
+            for item_id, future in futures.items():
+                self.results.pop((collection, item_id), None)
+                if not future.done():
+                    future.set_exception(e)
+
+    def forget(self, collection: str):
+        self.results = {key: future for key, future in self.results.items() if key[0] != collection}
+
+    @staticmethod
+    def forget_change(collection: str, before: dict = None, after: dict = None):
+        """
+        Database change hook, a request that writes to a collection reads it afresh afterwards.
+        """
+        loader = DataLoader.current()
+        if loader is not None:
+            loader.forget(collection)
+
+
+Database.change_hooks.append(DataLoader.forget_change)
@@ -1,5 +1,6 @@
 
 import datetime
+import functools
 from pprint import pprint
 
 
@@ -26,6 +27,7 @@ class DateFunctions:
             # add update properties
             item[column_name] = {
                 'timestamp': timestamp,
+                'epoch': int(now.timestamp()),
                 'timestamp_id': now.strftime("%Y%m%d%H%M%S%f"),
                 'date': timestamp[:-3],
                 'formatted_date_short': now.strftime(f"%d{suffix} %b %Y"),
@@ -71,6 +73,7 @@ class DateFunctions:
             # add payback properties
             item[column_name] = {
                 'timestamp': timestamp,
+                'epoch': int(payback_date.timestamp()),
                 'timestamp_id': payback_date.strftime("%Y%m%d%H%M%S%f"),
                 'date': timestamp[:-3],
                 'formatted_date_short': payback_date.strftime(f"%dth %b %Y"),
@@ -98,10 +101,36 @@ class DateFunctions:
     @staticmethod
     async def time_elapsed(date_string):
         try:
-            now = datetime.datetime.now()
-            date = datetime.datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S:%f')
-            delta = now - date
-            seconds = delta.total_seconds()
+            now = datetime.datetime.now().timestamp()
+            return DateFunctions.elapsed_since(DateFunctions.timestamp_to_epoch(date_string), now)
+        except Exception as e:
+            return ""
+
+    @staticmethod
+    @functools.lru_cache(maxsize=65536)
+    def timestamp_to_epoch(date_string):
+        # stored timestamps look like 2024-01-31 13:45:10:123456, swapping the last colon for a dot lets
+        # fromisoformat parse them, which is far cheaper than strptime
+        head, _, microseconds = date_string.rpartition(':')
+        return datetime.datetime.fromisoformat(f"{head}.{microseconds}").timestamp()
+
+    @staticmethod
+    def item_epoch(date_created):
+        """
+        Epoch seconds of a stored date dictionary, older documents only carry the formatted timestamp.
+        """
+        if not isinstance(date_created, dict):
+            return None
+        if date_created.get('epoch') is not None:
+            return date_created['epoch']
+        if date_created.get('timestamp'):
+            return DateFunctions.timestamp_to_epoch(date_created['timestamp'])
+        return None
+
+    @staticmethod
+    def elapsed_since(epoch, now):
+        try:
+            seconds = now - epoch
 
             if seconds < 0:
                 return 'in the future'
@@ -0,0 +1,122 @@
+import re
+from email.utils import formatdate
+import anyio
+from starlette.responses import Response
+from app.config import UPLOAD_CHUNK_SIZE
+
+# ab/cd/<sha256><ext> and the ab/cd/<sha256>.<size>.webp image variants, whose bytes never change
+CONTENT_ADDRESSED_KEY = re.compile(r"[0-9a-f]{2}/[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})(?:\.(?P<size>\w+)\.webp|\.\w+)?")
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+
+class FileCaching:
+    """
+    HTTP validators and range handling for the files served under /uploaded_files.
+
+    Content addressed files get a strong ETag made from their hash and are cached as immutable. Other files
+    (uploads from before the content addressed store) get a weak ETag from their size and modification time
+    and are revalidated on every use.
+    """
+
+    @staticmethod
+    def headers(key: str, stat: dict, immutable: bool = True) -> dict:
+        match = CONTENT_ADDRESSED_KEY.fullmatch(key)
+        if match:
+            etag = f'"{match["sha256"]}{"." + match["size"] if match["size"] else ""}"'
+        else:
+            etag = f'W/"{stat["size"]:x}-{int(stat["mtime"] * 1000):x}"'
+        return {
+            'etag': etag,
+            'last-modified': formatdate(stat['mtime'], usegmt=True),
+            'cache-control': IMMUTABLE_CACHE_CONTROL if match and immutable else REVALIDATE_CACHE_CONTROL,
+            'accept-ranges': 'bytes',
+        }
+
+    @staticmethod
+    def not_modified(request_headers, headers: dict) -> bool:
+        if_none_match = request_headers.get('if-none-match')
+        if if_none_match is None:
+            return False
+        # If-None-Match uses the weak comparison
+        etag = headers['etag'].removeprefix('W/')
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+
+    @staticmethod
+    def range_applies(request_headers, headers: dict) -> bool:
+        if_range = request_headers.get('if-range')
+        if if_range is None:
+            return True
+        # If-Range needs a strong validator, or exactly the Last-Modified date
+        if if_range.startswith('"'):
+            return not headers['etag'].startswith('W/') and if_range == headers['etag']
+        return if_range == headers['last-modified']
+
+    @staticmethod
+    def parse_range(range_header: str, size: int):
+        """
+        The (start, end) byte offsets, end included, of a single range request. None when the header should be
+        ignored and the whole file sent (malformed or several ranges), ValueError when it can't be satisfied.
+        """
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+        if not match or not (match[1] or match[2]):
+            return None
+        if not match[1]:
+            suffix_length = int(match[2])
+            if suffix_length == 0 or size == 0:
+                raise ValueError(range_header)
+            return max(size - suffix_length, 0), size - 1
+        start = int(match[1])
+        end = min(int(match[2]), size - 1) if match[2] else size - 1
+        if start >= size or start > end:
+            raise ValueError(range_header)
+        return start, end
+
+
+class StoredFileResponse(Response):
+    """
+    A local file, or one byte range of it, sent with the zero-copy ASGI extensions when the server offers them
+    (http.response.zerocopysend, then http.response.pathsend for whole files) and in chunks read off the event
+    loop otherwise.
+    """
+
+    def __init__(self, path, size: int, headers: dict, media_type: str = None, byte_range: tuple = None):
+        self.path = path
+        self.size = size
+        self.start, self.end = byte_range if byte_range else (0, size - 1)
+        headers = dict(headers)
+        headers['content-length'] = str(self.end - self.start + 1)
+        if byte_range:
+            headers['content-range'] = f"bytes {self.start}-{self.end}/{size}"
+        super().__init__(status_code=206 if byte_range else 200, headers=headers, media_type=media_type)
+
+    async def __call__(self, scope, receive, send):
+        await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+        count = self.end - self.start + 1
+        if scope.get('method') == 'HEAD' or count <= 0:
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            return
+
+        extensions = scope.get('extensions') or {}
+        if 'http.response.pathsend' in extensions and count == self.size and \
+                'http.response.zerocopysend' not in extensions:
+            await send({'type': 'http.response.pathsend', 'path': str(self.path)})
+            return
+
+        async with await anyio.open_file(self.path, 'rb') as file:
+            if 'http.response.zerocopysend' in extensions:
+                await send({'type': 'http.response.zerocopysend', 'file': file.wrapped, 'offset': self.start,
+                            'count': count, 'more_body': False})
+                return
+            await file.seek(self.start)
+            remaining = count
+            while remaining > 0:
+                chunk = await file.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': remaining > 0})
+            if remaining > 0:
+                # the file shrank under us, end the response rather than hang
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
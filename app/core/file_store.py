@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from pymongo import ReturnDocument
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from loguru import logger
+from app.config import UPLOADED_FILES_URL_PREFIX, MAX_UPLOAD_SIZE, UPLOAD_CHUNK_SIZE, UPLOAD_SPOOL_SIZE
+from app.core.database import Database
+from app.core.dateFunctions import DateFunctions
+from app.core.indexes import IndexRegistry
+from app.core.storage import Storage
+
+
+class FileStore:
+    """
+    Content addressed store for uploads and generated files.
+
+    Every blob is stored once in the configured Storage backend, named after the sha256 of its content and sharded
+    two levels deep by the first hex digits of the hash, e.g. 3f/a1/3fa1...e9.jpg served as
+    uploaded_files/3f/a1/3fa1...e9.jpg, so no directory grows past a few hundred entries and the URL of a file
+    never changes, whichever backend holds it. The file collection holds one document per blob (_id is
+    the hash) with its size, content type and a reference count, and storing content that is already there costs
+    no disk write. Documents that point at a stored file keep its hash in a <field>_sha256 column. The count only
+    moves through the Database change hooks, once such a document has actually been written: it is incremented
+    when a document starting to point at the file is inserted or updated and decremented when that document is
+    deleted or its file replaced, so uploads of rejected submissions are never counted. Blobs whose count is zero
+    are left in place, the count tells a cleanup which blobs no document uses.
+    """
+    collection_name = 'file'
+    tasks = set()
+
+    @staticmethod
+    def blob_key(sha256: str, extension: str = '') -> str:
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+    @staticmethod
+    def url(key: str) -> str:
+        return f"{UPLOADED_FILES_URL_PREFIX}/{key}"
+
+    @staticmethod
+    def key(url: str) -> str:
+        return url.removeprefix(f"{UPLOADED_FILES_URL_PREFIX}/")
+
+    @staticmethod
+    async def read_bytes(url: str) -> bytes:
+        return await Storage.get().read_bytes(FileStore.key(url))
+
+    @staticmethod
+    def extension(file_name: str) -> str:
+        extension = os.path.splitext(file_name or '')[1].lower()
+        return extension if re.fullmatch(r"\.[a-z0-9]{1,10}", extension) else ''
+
+    @staticmethod
+    async def save_upload(file: UploadFile) -> dict:
+        """
+        Hash an upload while reading it in fixed size chunks and store it unless the same content already is.
+        Uploads up to UPLOAD_SPOOL_SIZE are hashed in memory, so a repeat upload never touches the disk.
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_SIZE)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_SIZE:
+                    raise ValueError(f"{file.filename} is larger than the {MAX_UPLOAD_SIZE // (1024 * 1024)} MB upload limit")
+                await run_in_threadpool(FileStore._write_chunk, spool, digest, chunk)
+
+            extension = FileStore.extension(file.filename)
+            content_type = file.content_type or mimetypes.guess_type(file.filename)[0] or 'application/octet-stream'
+            return await FileStore.store(spool, digest.hexdigest(), size, extension, content_type, file.filename)
+        finally:
+            await run_in_threadpool(spool.close)
+
+    @staticmethod
+    def _write_chunk(output, digest, chunk):
+        # hashlib releases the GIL on large buffers, so hashing happens off the event loop alongside the write
+        digest.update(chunk)
+        output.write(chunk)
+
+    @staticmethod
+    async def save_bytes(data: bytes, extension: str, content_type: str, alias: str = None) -> dict:
+        """
+        Store generated content such as a rendered QR code, alias is an extra lookup key (see find_alias).
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_SIZE)
+        try:
+            spool.write(data)
+            return await FileStore.store(spool, hashlib.sha256(data).hexdigest(), len(data), extension,
+                                         content_type, alias=alias)
+        finally:
+            spool.close()
+
+    @staticmethod
+    async def store(source, sha256: str, size: int, extension: str, content_type: str, file_name: str = None,
+                    alias: str = None) -> dict:
+        files = await Database.create_collection_object(FileStore.collection_name)
+        date_created = (await DateFunctions.add_current_timestamp({}))['date_created']
+        update = {
+            '$setOnInsert': {
+                'references': 0,
+                'key': FileStore.blob_key(sha256, extension),
+                'size': size,
+                'content_type': content_type,
+                'file_name': file_name,
+                'date_created': date_created,
+            },
+        }
+        if alias:
+            update['$addToSet'] = {'aliases': alias}
+        document = await files.find_one_and_update({'_id': sha256}, update, upsert=True,
+                                                   return_document=ReturnDocument.AFTER)
+
+        # the first upload of this content writes the blob, later ones only find it there
+        storage = Storage.get()
+        if not await storage.exists(document['key']):
+            await storage.write(document['key'], source, size, content_type)
+            logger.info(f"Stored {document['key']} ({size} bytes)")
+
+        return {
+            'path': FileStore.url(document['key']),
+            'size': document['size'],
+            'sha256': sha256,
+            'content_type': document['content_type'],
+        }
+
+    @staticmethod
+    async def find_aliases(aliases: list) -> dict:
+        """
+        alias -> stored file URL for the aliases that are known.
+        """
+        try:
+            files = await Database.create_collection_object(FileStore.collection_name)
+            documents = await files.find({'aliases': {'$in': list(aliases)}}, {'key': 1, 'aliases': 1}).to_list(None)
+            wanted = set(aliases)
+            return {alias: FileStore.url(document['key']) for document in documents
+                    for alias in document.get('aliases', []) if alias in wanted}
+        except Exception as e:
+            logger.error(f"Error in FileStore.find_aliases: {e}")
+            return {}
+
+    @staticmethod
+    async def find_alias(alias: str):
+        return (await FileStore.find_aliases([alias])).get(alias)
+
+    @staticmethod
+    async def adjust_references(changes: dict):
+        """
+        Apply sha256 -> reference count change, one update per distinct change.
+        """
+        try:
+            files = await Database.create_collection_object(FileStore.collection_name)
+            by_change = {}
+            for sha256, change in changes.items():
+                if change:
+                    by_change.setdefault(change, []).append(sha256)
+            for change, sha256s in by_change.items():
+                await files.update_many({'_id': {'$in': sha256s}}, {'$inc': {'references': change}})
+        except Exception as e:
+            logger.error(f"Error in FileStore.adjust_references: {e}")
+
+    @staticmethod
+    def reference_change(collection: str, before: dict = None, after: dict = None):
+        """
+        Database change hook, counts the files a written document starts pointing at and releases the ones a
+        deleted or updated document no longer points at.
+        """
+        if collection == FileStore.collection_name:
+            return
+        before, after = before or {}, after or {}
+        changes = {}
+        for key in {key for key in [*before, *after] if key.endswith('_sha256')}:
+            if before.get(key) == after.get(key):
+                continue
+            if after.get(key):
+                changes[after[key]] = changes.get(after[key], 0) + 1
+            if before.get(key):
+                changes[before[key]] = changes.get(before[key], 0) - 1
+        if any(changes.values()):
+            task = asyncio.get_running_loop().create_task(FileStore.adjust_references(changes))
+            FileStore.tasks.add(task)
+            task.add_done_callback(FileStore.tasks.discard)
+
+IndexRegistry.register(FileStore.collection_name, ['aliases'])
+Database.change_hooks.append(FileStore.reference_change)
@@ -1,12 +1,11 @@
-import os
 import re
-from pathlib import Path
 from pprint import pprint
 
 # from fastapi import File, UploadFile
 from starlette.datastructures import UploadFile
 
-from app.core.dateFunctions import DateFunctions
+from app.core.file_store import FileStore
+from app.core.images import ImageDerivatives
 
 # configure logger
 from loguru import logger
@@ -27,30 +26,16 @@ class Form:
             # check if the item is an UploadFile object
             if isinstance(value, UploadFile):
                 file = value
-                # do something with the file
-                # save the file to the folder if it exists
-                if file:
-                    # create the folder if it doesn't exist
-                    Path("uploaded_files").mkdir(parents=True, exist_ok=True)
-
-                    # write file to disk
-                    # get the current time in the format YYYYMMDD_HHMMSS_microseconds
-                    timestamp = await DateFunctions.return_current_timestamp()
-                    # split the file name into the base name and the extension
-                    base_name, extension = os.path.splitext(file.filename)
-                    # append the timestamp to the base name
-                    file_name = f"{base_name}_{timestamp}"
-                    # add the extension back to the file name
-                    file_name = file_name + extension
-                    file_name = re.sub(r"[^\w.-]", "_", file_name)
-                    # append the timestamp to the file name
-                    # file_name = f"{file.filename}_{timestamp}"
-                    with open(f"../../uploaded_files/{file_name}", "wb") as f:
-                        f.write(await file.read())
-
-                    # form_data[key] = f"uploaded_files/{file_name}"
-                    item[key] = f"uploaded_files/{file_name}"
-                    keys_to_ignore.append(key)
+                keys_to_ignore.append(key)
+                # browsers send an empty file part when no file was chosen
+                if file and file.filename:
+                    saved_file = await FileStore.save_upload(file)
+                    item[key] = saved_file['path']
+                    item[f"{key}_sha256"] = saved_file['sha256']
+                    # photos get resized WebP variants in the background once the document is written, their URLs
+                    # are known up front
+                    if ImageDerivatives.applies_to(saved_file['content_type']):
+                        item[f"{key}_derivatives"] = ImageDerivatives.derivative_urls(saved_file['path'])
 
         # do not parse passwords coz passwords can either be int or string hence affected by password hashing
         password = False if await Form.dictionary_value_is_empty('password', form_data) else form_data['password']
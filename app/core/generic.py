@@ -28,6 +28,16 @@ class Generic:
             )
         )
 
+    @staticmethod
+    async def select_array_projection(value_column, text_column, merged_text_column=False) -> dict:
+        """
+        Projection pulling only the columns create_select_array reads.
+        """
+        projection = {'_id': 0, value_column: 1, text_column: 1}
+        if merged_text_column:
+            projection[merged_text_column] = 1
+        return projection
+
     @staticmethod
     async def filter_object_by_id_property(array: list[object], array_column_name: str,
                                            filter_value: Union[str, int]) -> \
@@ -0,0 +1,88 @@
+import asyncio
+import time
+from loguru import logger
+from app.core.database import Database
+
+
+class DatabaseHealth:
+    """
+    Background database liveness monitor with a circuit breaker.
+
+    closed    - database is reachable, requests go through
+    open      - probes failed failure_threshold times in a row, requests are refused until reset_timeout passes
+    half_open - reset_timeout passed, requests go through again while the next probe decides closed or open
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    state = CLOSED
+    consecutive_failures = 0
+    failure_threshold = 3
+    probe_interval = 5
+    reset_timeout = 15
+    opened_at = 0.0
+    last_checked = 0.0
+    task = None
+
+    @staticmethod
+    def is_available() -> bool:
+        return DatabaseHealth.state != DatabaseHealth.OPEN
+
+    @staticmethod
+    def record_success():
+        if DatabaseHealth.state != DatabaseHealth.CLOSED:
+            logger.info("Database connection restored, circuit closed")
+        DatabaseHealth.state = DatabaseHealth.CLOSED
+        DatabaseHealth.consecutive_failures = 0
+
+    @staticmethod
+    def record_failure():
+        DatabaseHealth.consecutive_failures += 1
+        if DatabaseHealth.state == DatabaseHealth.HALF_OPEN or \
+                DatabaseHealth.consecutive_failures >= DatabaseHealth.failure_threshold:
+            if DatabaseHealth.state != DatabaseHealth.OPEN:
+                logger.error("Database is not reachable, circuit opened")
+            DatabaseHealth.state = DatabaseHealth.OPEN
+            DatabaseHealth.opened_at = time.monotonic()
+
+    @staticmethod
+    async def probe():
+        live = await Database.is_live()
+        DatabaseHealth.last_checked = time.monotonic()
+        if live:
+            DatabaseHealth.record_success()
+        else:
+            DatabaseHealth.record_failure()
+        return live
+
+    @staticmethod
+    async def monitor():
+        while True:
+            try:
+                if DatabaseHealth.state == DatabaseHealth.OPEN:
+                    await asyncio.sleep(max(DatabaseHealth.opened_at + DatabaseHealth.reset_timeout - time.monotonic(), 0))
+                    DatabaseHealth.state = DatabaseHealth.HALF_OPEN
+                else:
+                    await asyncio.sleep(DatabaseHealth.probe_interval)
+                await DatabaseHealth.probe()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in DatabaseHealth.monitor: {e}")
+
+    @staticmethod
+    async def start():
+        await DatabaseHealth.probe()
+        if DatabaseHealth.task is None or DatabaseHealth.task.done():
+            DatabaseHealth.task = asyncio.create_task(DatabaseHealth.monitor())
+
+    @staticmethod
+    async def stop():
+        if DatabaseHealth.task is not None:
+            DatabaseHealth.task.cancel()
+            try:
+                await DatabaseHealth.task
+            except asyncio.CancelledError:
+                pass
+            DatabaseHealth.task = None
@@ -0,0 +1,135 @@
+import asyncio
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from loguru import logger
+from app.core.database import Database
+from app.core.file_store import FileStore
+from app.core.storage import Storage
+
+IMAGE_DERIVATIVE_WORKERS = int(os.environ.get('IMAGE_DERIVATIVE_WORKERS', max((os.cpu_count() or 1) // 2, 1)))
+# longest side in pixels of each variant, None keeps the original dimensions
+IMAGE_DERIVATIVE_SIZES = {
+    'avatar': 96,
+    'thumb': 320,
+    'medium': 1280,
+    'full': None,
+}
+IMAGE_DERIVATIVE_QUALITY = 80
+# formats Pillow can decode into something worth resizing, vector and animated images are left as uploaded
+# (HEIC needs the pillow-heif plugin, which is not a dependency)
+IMAGE_DERIVATIVE_CONTENT_TYPES = {'image/jpeg', 'image/png', 'image/webp', 'image/bmp', 'image/tiff'}
+
+
+def render_derivatives(data: bytes, sizes: dict, quality: int) -> dict:
+    """
+    Decode an image once and encode a WebP per size, runs inside the image worker processes.
+    The EXIF orientation is applied to the pixels and no metadata is written to the variants.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+    variants = {}
+    for size, longest_side in sizes.items():
+        variant = image.copy()
+        if longest_side:
+            variant.thumbnail((longest_side, longest_side), Image.LANCZOS)
+        output = io.BytesIO()
+        variant.save(output, 'WEBP', quality=quality, method=4)
+        variants[size] = output.getvalue()
+    return variants
+
+
+class ImageDerivatives:
+    """
+    Resized, EXIF free WebP variants of uploaded photos, generated in the background after the upload.
+
+    Variants are stored next to the original under a name derived from it, ab/cd/<sha256>.<size>.webp, so their
+    URLs are known as soon as the upload is (Form.extract_form_input records them on the document as
+    <field>_derivatives) and the uploaded-file route can serve ?size=<size> without a database lookup, falling back
+    to the original until the variant exists. Generation starts from a Database change hook once the document
+    pointing at the photo has been written, so rejected submissions cost no rendering. The file document lists the
+    generated variants, so uploading the same photo again does not render them again.
+    """
+    executor = None
+    tasks = set()
+
+    @staticmethod
+    def worker_pool():
+        if ImageDerivatives.executor is None:
+            ImageDerivatives.executor = ProcessPoolExecutor(max_workers=IMAGE_DERIVATIVE_WORKERS)
+        return ImageDerivatives.executor
+
+    @staticmethod
+    def shutdown_worker_pool():
+        if ImageDerivatives.executor is not None:
+            ImageDerivatives.executor.shutdown(wait=False, cancel_futures=True)
+            ImageDerivatives.executor = None
+
+    @staticmethod
+    def applies_to(content_type: str) -> bool:
+        return (content_type or '').lower() in IMAGE_DERIVATIVE_CONTENT_TYPES
+
+    @staticmethod
+    def derivative_key(key: str, size: str) -> str:
+        return f"{re.sub(r'[.][^./]*$', '', key)}.{size}.webp"
+
+    @staticmethod
+    def derivative_urls(url: str) -> dict:
+        return {size: FileStore.url(ImageDerivatives.derivative_key(FileStore.key(url), size))
+                for size in IMAGE_DERIVATIVE_SIZES}
+
+    @staticmethod
+    def schedule(saved_file: dict):
+        """
+        Generate the variants of a saved upload in the background, saved_file as returned by FileStore.
+        """
+        task = asyncio.get_running_loop().create_task(ImageDerivatives.generate(saved_file))
+        ImageDerivatives.tasks.add(task)
+        task.add_done_callback(ImageDerivatives.tasks.discard)
+
+    @staticmethod
+    def schedule_change(collection: str, before: dict = None, after: dict = None):
+        """
+        Database change hook, schedules the variants of the photos a written document starts pointing at.
+        """
+        if not after or collection == FileStore.collection_name:
+            return
+        before = before or {}
+        for key in after:
+            if not key.endswith('_derivatives'):
+                continue
+            field = key.removesuffix('_derivatives')
+            sha256 = after.get(f"{field}_sha256")
+            if sha256 and after.get(field) and before.get(f"{field}_sha256") != sha256:
+                ImageDerivatives.schedule({'sha256': sha256, 'path': after[field]})
+
+    @staticmethod
+    async def generate(saved_file: dict):
+        try:
+            files = await Database.create_collection_object(FileStore.collection_name)
+            document = await files.find_one({'_id': saved_file['sha256']}, {'derivatives': 1})
+            if document and set(document.get('derivatives', {})) >= set(IMAGE_DERIVATIVE_SIZES):
+                return
+
+            data = await FileStore.read_bytes(saved_file['path'])
+            loop = asyncio.get_running_loop()
+            variants = await loop.run_in_executor(ImageDerivatives.worker_pool(), render_derivatives, data,
+                                                  IMAGE_DERIVATIVE_SIZES, IMAGE_DERIVATIVE_QUALITY)
+
+            storage = Storage.get()
+            derivatives = {}
+            for size, image in variants.items():
+                key = ImageDerivatives.derivative_key(FileStore.key(saved_file['path']), size)
+                await storage.write(key, io.BytesIO(image), len(image), 'image/webp')
+                derivatives[size] = key
+            await files.update_one({'_id': saved_file['sha256']}, {'$set': {'derivatives': derivatives}})
+            logger.info(f"Image derivatives of {saved_file['path']}: {', '.join(derivatives)}")
+        except Exception as e:
+            logger.error(f"Failed to generate image derivatives of {saved_file.get('path')}: {e}")
+
+
+Database.change_hooks.append(ImageDerivatives.schedule_change)
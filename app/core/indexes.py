@@ -0,0 +1,60 @@
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from loguru import logger
+from app.core.database import Database
+
+
+class IndexRegistry:
+    """
+    Declarative registry of the indexes each collection needs, applied once at startup.
+
+    Every service registers the fields its queries filter or sort on, e.g.
+    IndexRegistry.register(ParticipantService.collection_name, ['name', 'email', 'phone'])
+    Each entry is either a field name (single ascending index) or a list of (field, direction) tuples (compound).
+    Every collection also gets a descending index on the integer id, which all fetches sort on.
+    """
+    indexes = {}
+
+    @staticmethod
+    def register(collection: str, fields: list):
+        models = IndexRegistry.indexes.setdefault(collection, {})
+        for keys in [[('id', DESCENDING)]] + list(fields):
+            keys = [(keys, ASCENDING)] if isinstance(keys, str) else keys
+            model = IndexModel(keys)
+            models[model.document['name']] = model
+
+    @staticmethod
+    async def apply_all():
+        for collection, models in IndexRegistry.indexes.items():
+            try:
+                collection_object = await Database.create_collection_object(collection)
+                if collection_object is None:
+                    continue
+                await collection_object.create_indexes(list(models.values()))
+            except Exception as e:
+                logger.error(f"Error in IndexRegistry.apply_all for {collection}: {e}")
+
+    @staticmethod
+    async def report():
+        """
+        Compare the declared indexes with the ones on the server and their $indexStats usage counters.
+        """
+        report = {}
+        for collection, models in IndexRegistry.indexes.items():
+            try:
+                collection_object = await Database.create_collection_object(collection)
+                if collection_object is None:
+                    continue
+                existing = await collection_object.index_information()
+                stats = await collection_object.aggregate([{'$indexStats': {}}]).to_list(None)
+                usage = {stat['name']: int(stat.get('accesses', {}).get('ops', 0)) for stat in stats}
+                report[collection] = {
+                    'declared': list(models.keys()),
+                    'missing': [name for name in models if name not in existing],
+                    'undeclared': [name for name in existing if name not in models and name != '_id_'],
+                    'unused': [name for name, ops in usage.items() if ops == 0 and name != '_id_'],
+                    'usage': usage,
+                }
+            except Exception as e:
+                logger.error(f"Error in IndexRegistry.report for {collection}: {e}")
+                report[collection] = {'error': str(e)}
+        return report
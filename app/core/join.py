@@ -0,0 +1,109 @@
+import asyncio
+from loguru import logger
+from app.core.database import Database
+from app.core.dataloader import DataLoader
+
+
+class Join:
+    """
+    Resolve foreign key columns (user_id, stage_id, product_id ...) into display values.
+
+    A join spec is a dictionary such as
+    {'collection': 'user', 'local_column': 'user_id', 'display_column': 'fullname', 'as': 'agent'}
+    meaning "read item['user_id'], find the user whose id matches and copy its fullname into item['agent']".
+    Only the ids referenced by the items are fetched, in a single $in query per spec, or through the request's
+    DataLoader when there is one so related documents already read by this request are not read again.
+    """
+
+    @staticmethod
+    async def integer_id(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    async def index_by_id(items: list, id_column: str = 'id') -> dict:
+        index = {}
+        for item in items or []:
+            item_id = await Join.integer_id(item.get(id_column))
+            if item_id is not None:
+                index[item_id] = item
+        return index
+
+    @staticmethod
+    def project(item: dict, display_columns: list) -> dict:
+        return {column: item[column] for column in ['id', *display_columns] if column in item}
+
+    @staticmethod
+    async def fetch_index(collection: str, ids: list, display_columns: list) -> dict:
+        """
+        Fetch the documents of a collection whose integer id is in ids, returned as an id -> document dictionary.
+        Only the id and the display columns of each document are returned.
+        """
+        try:
+            integer_ids = {await Join.integer_id(item_id) for item_id in ids}
+            integer_ids.discard(None)
+            if not integer_ids:
+                return {}
+            loader = DataLoader.current()
+            if loader is not None:
+                # the loader memoises whole documents for the request, only their display columns are handed on,
+                # as fresh dictionaries so nothing downstream can alter the loader's or the ReferenceCache's copy
+                items = await loader.load_many(collection, list(integer_ids))
+                return await Join.index_by_id([Join.project(item, display_columns) for item in items if item])
+            projection = {'_id': 0, 'id': 1}
+            projection.update({column: 1 for column in display_columns})
+            items = await Database.fetch_many_items_by_integer_ids(collection, list(integer_ids), projection)
+            return await Join.index_by_id(items)
+        except Exception as e:
+            logger.error(f"Error in Join.fetch_index: {e}")
+            return {}
+
+    @staticmethod
+    async def attach(items: list, join: dict, default='Error') -> list:
+        """
+        Apply a single join spec to a list of items in place.
+        """
+        index = await Join.fetch_index(
+            join['collection'],
+            [item.get(join['local_column']) for item in items],
+            [join['display_column']]
+        )
+        for item in items:
+            related = index.get(await Join.integer_id(item.get(join['local_column'])), {})
+            item[join['as']] = related.get(join['display_column'], default)
+        return items
+
+    @staticmethod
+    async def attach_many(items: list, joins: list, default='Error') -> list:
+        """
+        Apply several join specs to a list of items, querying the related collections concurrently.
+        """
+        if items:
+            await asyncio.gather(*(Join.attach(items, join, default) for join in joins))
+        return items
+
+    @staticmethod
+    async def lookup_stages(joins: list, default='Error') -> list:
+        """
+        Translate join specs into $lookup / $addFields aggregation stages so the join runs on the server.
+        """
+        stages = []
+        for join in joins:
+            stages.append({'$lookup': {
+                'from': join['collection'],
+                'let': {'local_value': {'$convert': {
+                    'input': f"${join['local_column']}", 'to': 'int', 'onError': None, 'onNull': None
+                }}},
+                'pipeline': [
+                    {'$match': {'$expr': {'$eq': ['$id', '$$local_value']}}},
+                    {'$limit': 1},
+                    {'$project': {'_id': 0, join['display_column']: 1}}
+                ],
+                'as': join['as']
+            }})
+            stages.append({'$addFields': {
+                join['as']: {'$ifNull': [{'$arrayElemAt': [f"${join['as']}.{join['display_column']}", 0]}, default]}
+            }})
+        return stages
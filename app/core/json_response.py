@@ -0,0 +1,70 @@
+import decimal
+import functools
+import inspect
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_default(value):
+    """
+    The types orjson does not know, everything else (pydantic models, paths ...) goes through jsonable_encoder.
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return jsonable_encoder(value)
+
+
+class EnvelopeResponse(JSONResponse):
+    """
+    The application's JSON response, serialised with orjson when it is installed.
+
+    orjson encodes datetimes, dates and UUIDs itself and ObjectIds through encode_default, so the envelopes built by
+    Form.return_response are written in a single pass instead of being copied by jsonable_encoder and then encoded
+    by the stdlib json module. Without orjson, or for content orjson refuses (integers wider than 64 bits), the
+    usual jsonable_encoder + json path is used.
+    """
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(content, default=encode_default, option=orjson.OPT_NON_STR_KEYS)
+            except (orjson.JSONEncodeError, TypeError):
+                pass
+        return super().render(jsonable_encoder(content, custom_encoder={ObjectId: str}))
+
+
+class EnvelopeRoute(APIRoute):
+    """
+    Route class that hands the dicts and lists returned by endpoints straight to EnvelopeResponse.
+
+    FastAPI runs every return value that isn't a Response through jsonable_encoder, which rebuilds the whole
+    envelope before it is encoded. Endpoints of routers declared with route_class=EnvelopeRoute skip that copy,
+    the response is built from the plain dict or list as it was returned. Other return values (pydantic models)
+    are left to FastAPI, and endpoints that return a Response are unaffected.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = self.wrap_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def wrap_endpoint(self, endpoint):
+        @functools.wraps(endpoint)
+        async def envelope_endpoint(*args, **kwargs):
+            content = await endpoint(*args, **kwargs)
+            if type(content) in (dict, list):
+                return EnvelopeResponse(content, status_code=self.status_code or 200)
+            return content
+
+        return envelope_endpoint
@@ -1,13 +1,19 @@
 
+import asyncio
 from pprint import pprint
 import re
 from app.core.form import Form
 from app.core.database import Database
+from app.core.counts import Counts
+from app.core.join import Join
 
 
 class Pagination:
     @staticmethod
-    async def pagination_details(page_number, page_size, total_records, url) -> dict:
+    async def pagination_details(page_number, page_size, total_records, url, cursor: dict = None) -> dict:
+
+        if cursor:
+            return await Pagination.cursor_pagination_details(page_size, total_records, url, cursor)
 
         page_number = int(page_number)
         page_size = int(page_size)
@@ -56,7 +62,94 @@ class Pagination:
         return pagination_details
 
     @staticmethod
-    async def paginated_items(page_number, page_size, collection, query_list_of_dictionaries=None, exclude_list_of_dictionaries=None) -> dict:
+    async def cursor_pagination_details(page_size, total_records, url, cursor: dict) -> dict:
+        """
+        Pagination links for keyset pages, cursor holds the first_id and last_id of the page being shown and
+        whether there are newer (has_previous) or older (has_next) items around it.
+        """
+        page_size = int(page_size)
+        total_records = int(total_records)
+        total_pages = (total_records + page_size - 1) // page_size if total_records > 0 else 0
+
+        entries = f"""
+        Showing {format(cursor.get('count', 0), ',')} of {format(total_records, ',')} entries
+        """
+        return {
+            'showing_entries': entries,
+            'first_page_link': f'{url}/1/{page_size}',
+            'last_page_link': f'{url}/before/0/{page_size}',
+            'previous_page_link': f"{url}/before/{cursor['first_id']}/{page_size}" if cursor.get('has_previous') else '#!',
+            'next_page_link': f"{url}/after/{cursor['last_id']}/{page_size}" if cursor.get('has_next') else '#!',
+            'page_number': None,
+            'page_size': page_size,
+            'pagination_links': [],
+            'total_pages': format(total_pages, ','),
+            'total_records': format(total_records, ','),
+        }
+
+    @staticmethod
+    async def cursor_results(page_size, collection, url, after_id=None, before_id=None, joins=None,
+                             query_list_of_dictionaries=None, exclude_list_of_dictionaries=None,
+                             projection=None) -> dict:
+        """
+        Keyset variant of paginated_results, walks the id sequence with after_id / before_id instead of skip().
+        """
+        page_size = int(page_size)
+
+        # fetch one extra item to know whether there is another page in the direction we are moving
+        items = await Database.fetch_many_items_keyset(
+            collection,
+            page_size + 1,
+            after_id,
+            before_id,
+            query_list_of_dictionaries,
+            exclude_list_of_dictionaries,
+            projection=projection
+        )
+        if before_id is not None:
+            has_previous = len(items) > page_size
+            items = items[-page_size:]
+            # a page reached backwards has a next page only if something older than its last item exists,
+            # e.g. the last_page_link page (before id 0) does not
+            older = await Database.fetch_many_items_keyset(
+                collection,
+                1,
+                items[-1]['id'] if items else int(before_id) + 1,
+                None,
+                query_list_of_dictionaries,
+                exclude_list_of_dictionaries,
+                time_elapsed=False,
+                projection={'_id': 0, 'id': 1}
+            )
+            has_next = bool(older)
+        else:
+            has_previous = after_id is not None
+            has_next = len(items) > page_size
+            items = items[:page_size]
+
+        await Join.attach_many(items, joins or [])
+
+        paginated_results_count = await Counts.count(collection, query_list_of_dictionaries, exclude_list_of_dictionaries)
+
+        cursor = {
+            'count': len(items),
+            'first_id': items[0]['id'] if items else before_id,
+            'last_id': items[-1]['id'] if items else after_id,
+            'has_previous': has_previous and bool(items),
+            'has_next': has_next and bool(items),
+        }
+        pagination_details = await Pagination.pagination_details(
+            1, page_size, paginated_results_count, url, cursor
+        )
+        return {
+            'results': items,
+            'pagination_details': pagination_details,
+            'total_count': paginated_results_count,
+        }
+
+    @staticmethod
+    async def paginated_items(page_number, page_size, collection, query_list_of_dictionaries=None,
+                              exclude_list_of_dictionaries=None, projection=None) -> dict:
         page_number = int(page_number)
         page_size = int(page_size)
         items = await Database.fetch_many_items_paginated(
@@ -64,22 +157,76 @@ class Pagination:
             page_number,
             page_size,
             query_list_of_dictionaries,
-            exclude_list_of_dictionaries
+            exclude_list_of_dictionaries,
+            projection=projection
         )
         return items
 
     @staticmethod
-    async def paginated_results(page_number, page_size, collection, url, query_list_of_dictionaries=None, exclude_list_of_dictionaries=None) -> dict:
+    async def paginated_results(page_number, page_size, collection, url, query_list_of_dictionaries=None,
+                                exclude_list_of_dictionaries=None, after_id=None, before_id=None,
+                                projection=None) -> dict:
+
+        if after_id is not None or before_id is not None:
+            return await Pagination.cursor_results(page_size, collection, url, after_id, before_id, None,
+                                                   query_list_of_dictionaries, exclude_list_of_dictionaries,
+                                                   projection)
 
         paginated_results = await Pagination.paginated_items(
             page_number,
             page_size,
             collection,
             query_list_of_dictionaries,
-            exclude_list_of_dictionaries
+            exclude_list_of_dictionaries,
+            projection
+        )
+
+        paginated_results_count = await Counts.count(collection, query_list_of_dictionaries, exclude_list_of_dictionaries)
+
+        pagination_details = await Pagination.pagination_details(
+            page_number, page_size, paginated_results_count, url
+        )
+        return {
+            'results': paginated_results,
+            'pagination_details': pagination_details,
+            'total_count': paginated_results_count,
+        }
+
+    @staticmethod
+    async def aggregated_results(page_number, page_size, collection, url, joins=None, query_list_of_dictionaries=None,
+                                 exclude_list_of_dictionaries=None, after_id=None, before_id=None,
+                                 projection=None) -> dict:
+        """
+        Same result shape as paginated_results, but the page and the joined display columns (see Join for the join
+        spec format) come back from a single aggregation round trip, run alongside the Counts total.
+        """
+        if after_id is not None or before_id is not None:
+            return await Pagination.cursor_results(page_size, collection, url, after_id, before_id, joins,
+                                                   query_list_of_dictionaries, exclude_list_of_dictionaries,
+                                                   projection)
+
+        page_number = int(page_number)
+        page_size = int(page_size)
+
+        query = {"$or": query_list_of_dictionaries} if query_list_of_dictionaries else {}
+        if exclude_list_of_dictionaries:
+            query["$nor"] = exclude_list_of_dictionaries
+
+        projection = Database.read_projection(collection, projection)
+        pipeline = [
+            {'$match': query},
+            {'$sort': {'id': -1}},
+            {'$skip': (page_number - 1) * page_size},
+            {'$limit': page_size},
+            *([{'$project': projection}] if projection else []),
+            *await Join.lookup_stages(joins or [])
+        ]
+        items, paginated_results_count = await asyncio.gather(
+            Database.aggregate(collection, pipeline),
+            Counts.count(collection, query_list_of_dictionaries, exclude_list_of_dictionaries)
         )
 
-        paginated_results_count = await Database.count_items(collection, query_list_of_dictionaries, exclude_list_of_dictionaries)
+        paginated_results = await Database.format_items_to_be_returned(items)
 
         pagination_details = await Pagination.pagination_details(
             page_number, page_size, paginated_results_count, url
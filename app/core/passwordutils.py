@@ -1,18 +1,49 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from argon2 import PasswordHasher
 
+# argon2 is memory hard and takes tens of milliseconds per call, the async variants run it on a bounded pool so
+# a burst of logins queues up there instead of stalling the event loop; argon2-cffi releases the GIL while hashing
+PASSWORD_HASHING_CONCURRENCY = int(os.environ.get('PASSWORD_HASHING_CONCURRENCY', 4))
+
 
 class PasswordUtils:
+    hasher = PasswordHasher()
+    executor = ThreadPoolExecutor(max_workers=PASSWORD_HASHING_CONCURRENCY, thread_name_prefix='password-hashing')
+
     @staticmethod
     def hash_password(password: str) -> str:
         """Hash the provided password using argon2"""
-        hashed_password = PasswordHasher().hash(password)
+        hashed_password = PasswordUtils.hasher.hash(password)
         return hashed_password
 
     @staticmethod
     def verify_password(password: str, hashed_password: str) -> bool:
         """Verify the provided password against the hashed password"""
         try:
-            valid_password = PasswordHasher().verify(hashed_password, password)
+            valid_password = PasswordUtils.hasher.verify(hashed_password, password)
             return valid_password
         except Exception as e:
             return False
+
+    @staticmethod
+    def check_needs_rehash(hashed_password: str) -> bool:
+        """Check whether the hash was made with older argon2 parameters than the configured hasher"""
+        try:
+            return PasswordUtils.hasher.check_needs_rehash(hashed_password)
+        except Exception as e:
+            return False
+
+    @staticmethod
+    async def hash_password_async(password: str) -> str:
+        """Hash the provided password on the password hashing pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(PasswordUtils.executor, PasswordUtils.hash_password, str(password))
+
+    @staticmethod
+    async def verify_password_async(password: str, hashed_password: str) -> bool:
+        """Verify the provided password on the password hashing pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(PasswordUtils.executor, PasswordUtils.verify_password, str(password),
+                                          hashed_password)
@@ -1,68 +1,109 @@
-from pathlib import Path
+import asyncio
+import hashlib
+import io
+import math
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 import qrcode
+from PIL import Image
 from fastapi import APIRouter
+from loguru import logger
 from typing import Optional, Union
 import os
-import re
 
 
 # dependencies
-from app.core.dateFunctions import DateFunctions
 from app.core.form import Form
+from app.core.file_store import FileStore
 
 # modules
 
 router = APIRouter(prefix="/qrcode")
 
 PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
-QRCODE_DESTINATION_PATH = Path('uploaded_files').resolve()
-QRCODE_DESTINATION_PATH.mkdir(parents=True, exist_ok=True)
-QRCODE_API_IMAGE_PATH = "uploaded_files"
+QRCODE_WORKERS = int(os.environ.get('QRCODE_WORKERS', os.cpu_count() or 1))
+QRCODE_VERSION = 1
+QRCODE_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_L
+QRCODE_BOX_SIZE = 10
+QRCODE_BORDER = 4
+QRCODE_PDF_BATCH_SIZE = 100
+# a sheet of 400 codes at the default size is about 5800 x 5800 pixels
+QRCODE_SPRITE_LIMIT = 400
+
+
+def render_qrcode(data: str, version: int, error_correction: int, box_size: int, border: int) -> bytes:
+    """
+    Build and rasterise a QR code into PNG bytes, runs inside the QR code worker processes.
+    """
+    # Create a QR code instance
+    qr = qrcode.QRCode(
+        version=version,
+        error_correction=error_correction,
+        box_size=box_size,
+        border=border,
+    )
+
+    # Add data to the QR code
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    # Generate the QR code image
+    img = qr.make_image(fill_color="black", back_color="white")
+
+    output = io.BytesIO()
+    img.save(output)
+    return output.getvalue()
 
 
 class Qrcode:
-    @staticmethod
-    @staticmethod
-    async def generate_qrcode(data: str, entity_type: str, entity_id: Optional[Union[str, int]] = None,
-                              qr_code_type: str = "id") -> str:
-        try:
-            # Create a QR code instance
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-
-            # Add data to the QR code
-            qr.add_data(data)
-            qr.make(fit=True)
+    executor = None
+    pending = {}
 
-            # Generate the QR code image
-            img = qr.make_image(fill_color="black", back_color="white")
-
-            # Get the absolute path of the 'uploaded_files' directory
-            QRCODE_DESTINATION_PATH = Path('uploaded_files').resolve()
-
-            # Create the destination folder if it doesn't exist
-            QRCODE_DESTINATION_PATH.mkdir(parents=True, exist_ok=True)
+    @staticmethod
+    def worker_pool():
+        if Qrcode.executor is None:
+            Qrcode.executor = ProcessPoolExecutor(max_workers=QRCODE_WORKERS)
+        return Qrcode.executor
 
-            # Generate the file name
-            timestamp = await DateFunctions.return_current_timestamp()
-            file_name = f"{entity_type}_{qr_code_type}_{entity_id}_{timestamp}.png" if entity_id else f"{entity_type}_{qr_code_type}_{timestamp}.png"
-            file_name = re.sub(r'[^a-zA-Z0-9._]', '_', file_name)
-            # Construct the file path using Path.joinpath()
-            file_path = QRCODE_DESTINATION_PATH.joinpath(file_name)
+    @staticmethod
+    def shutdown_worker_pool():
+        if Qrcode.executor is not None:
+            Qrcode.executor.shutdown(wait=False, cancel_futures=True)
+            Qrcode.executor = None
 
-            # Save the QR code image to a file
-            with file_path.open('wb') as f:
-                img.save(f)
+    @staticmethod
+    def cache_key(data: str, version: int = QRCODE_VERSION, error_correction: int = QRCODE_ERROR_CORRECTION,
+                  box_size: int = QRCODE_BOX_SIZE, border: int = QRCODE_BORDER) -> str:
+        return hashlib.sha256(f"{data}|{version}|{error_correction}|{box_size}|{border}".encode()).hexdigest()
 
-            print(f"QR code for {entity_type} {qr_code_type} saved as {file_name}")
-            return f"{QRCODE_API_IMAGE_PATH}/{file_name}"
+    @staticmethod
+    async def generate_qrcode(data: str, entity_type: str, entity_id: Optional[Union[str, int]] = None,
+                              qr_code_type: str = "id", version: int = QRCODE_VERSION,
+                              error_correction: int = QRCODE_ERROR_CORRECTION, box_size: int = QRCODE_BOX_SIZE,
+                              border: int = QRCODE_BORDER) -> str:
+        """
+        Render a QR code on the worker pool and keep it in the FileStore, aliased by a hash of the data and
+        rendering options, so asking again for the same QR code returns the stored file without rendering it.
+        """
+        try:
+            alias = Qrcode.cache_key(str(data), version, error_correction, box_size, border)
+            path = await FileStore.find_alias(alias)
+            if path is None:
+                # concurrent requests for the same QR code share one render
+                render = Qrcode.pending.get(alias)
+                if render is None:
+                    render = asyncio.ensure_future(
+                        Qrcode.render_and_store(str(data), version, error_correction, box_size, border, alias))
+                    Qrcode.pending[alias] = render
+                    render.add_done_callback(lambda _: Qrcode.pending.pop(alias, None))
+                path = await asyncio.shield(render)
+                logger.info(f"QR code for {entity_type} {qr_code_type} {entity_id or ''} saved as {path}")
+
+            return path
 
         except Exception as e:
-            print(str(e))
+            logger.error(f"Failed to generate QR code: {e}")
             return await Form.return_response(
                 True,
                 'Failed to generate QR code',
@@ -71,6 +112,15 @@ class Qrcode:
                 'danger'
             )
 
+    @staticmethod
+    async def render_and_store(data: str, version: int, error_correction: int, box_size: int, border: int,
+                               alias: str) -> str:
+        loop = asyncio.get_running_loop()
+        image = await loop.run_in_executor(Qrcode.worker_pool(), render_qrcode, data, version, error_correction,
+                                           box_size, border)
+        saved_file = await FileStore.save_bytes(image, '.png', 'image/png', alias)
+        return saved_file['path']
+
     @staticmethod
     async def generate_id_qrcode(entity_type: str, entity_id: Union[str, int]):
         return await Qrcode.generate_qrcode(str(entity_id), entity_type, entity_id, "id")
@@ -83,6 +133,79 @@ class Qrcode:
     async def generate_web_qrcode(entity_type: str, entity_id: Union[str, int], web_url: str):
         return await Qrcode.generate_qrcode(web_url, entity_type, entity_id, "web")
 
+    @staticmethod
+    async def generate_bulk_id_qrcodes(entity_type: str, entity_ids: list) -> dict:
+        """
+        Render id QR codes for many entities at once, spread over the worker processes.
+        Returns the PNG bytes keyed by entity id together with throughput stats.
+        """
+        started = time.perf_counter()
+        entity_ids = list(dict.fromkeys(entity_ids))
+        cache_hits = len(await FileStore.find_aliases([Qrcode.cache_key(str(entity_id)) for entity_id in entity_ids]))
+        paths = await asyncio.gather(*(Qrcode.generate_id_qrcode(entity_type, entity_id) for entity_id in entity_ids))
+
+        rendered = {entity_id: path for entity_id, path in zip(entity_ids, paths) if isinstance(path, str)}
+        failed = [entity_id for entity_id in entity_ids if entity_id not in rendered]
+        # read back through the storage backend, which may not be the local disk
+        images = await asyncio.gather(*(FileStore.read_bytes(path) for path in rendered.values()))
+        files = dict(zip(rendered, images))
+
+        seconds = time.perf_counter() - started
+        return {
+            'files': files,
+            'stats': {
+                'requested': len(entity_ids),
+                'rendered': len(files) - cache_hits,
+                'cache_hits': cache_hits,
+                'failed': len(failed),
+                'seconds': round(seconds, 3),
+                'per_second': round(len(files) / seconds, 1) if seconds > 0 else len(files),
+            }
+        }
+
+    @staticmethod
+    def package_zip(files: dict, entity_type: str, output):
+        # PNGs are already compressed, storing them is as small and much faster than deflating again
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for entity_id, image in files.items():
+                archive.writestr(f"{entity_type}_{entity_id}.png", image)
+
+    @staticmethod
+    def package_pdf(files: dict, entity_type: str, output):
+        # one QR code per page, written QRCODE_PDF_BATCH_SIZE pages at a time as incremental updates of the same
+        # PDF so only one batch of pages is ever decoded in memory
+        images = list(files.values())
+        for start in range(0, len(images), QRCODE_PDF_BATCH_SIZE):
+            pages = [Image.open(io.BytesIO(image)) for image in images[start:start + QRCODE_PDF_BATCH_SIZE]]
+            pages[0].save(output, 'PDF', save_all=True, append_images=pages[1:], append=start > 0)
+            for page in pages:
+                page.close()
+
+    @staticmethod
+    def package_sprite(files: dict, entity_type: str, output):
+        """
+        All QR codes on a single PNG sheet, laid out in a square grid in the order they were requested.
+        The sheet grows with the square of the grid, callers cap the count at QRCODE_SPRITE_LIMIT.
+        """
+        if not files:
+            return
+        if len(files) > QRCODE_SPRITE_LIMIT:
+            raise ValueError(f"A sprite sheet holds at most {QRCODE_SPRITE_LIMIT} QR codes")
+        # the first pass only reads the image headers
+        sizes = []
+        for image in files.values():
+            with Image.open(io.BytesIO(image)) as header:
+                sizes.append(header.size)
+        columns = math.ceil(math.sqrt(len(sizes)))
+        rows = math.ceil(len(sizes) / columns)
+        cell_width = max(width for width, _ in sizes)
+        cell_height = max(height for _, height in sizes)
+        sheet = Image.new('L', (columns * cell_width, rows * cell_height), 255)
+        for index, image in enumerate(files.values()):
+            with Image.open(io.BytesIO(image)) as qrcode_image:
+                sheet.paste(qrcode_image.convert('L'),
+                            ((index % columns) * cell_width, (index // columns) * cell_height))
+        sheet.save(output, 'PNG', optimize=True)
 
 # @router.get('/school/{school_id}')
 # async def all_students_datatable_(request: Request, school_id: str):
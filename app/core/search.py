@@ -0,0 +1,131 @@
+import re
+import unicodedata
+from urllib.parse import quote
+from pymongo import UpdateOne
+from loguru import logger
+from app.core.cache import ReferenceCache
+from app.core.database import Database
+from app.core.indexes import IndexRegistry
+from app.core.join import Join
+from app.core.pagination import Pagination
+
+SEARCH_MAX_PAGE_SIZE = 50
+# bounds the number of index keys a long value produces, words past this can't start a match
+SEARCH_MAX_WORDS = 8
+BACKFILL_BATCH_SIZE = 500
+
+
+class Search:
+    """
+    Prefix search on normalised copies of the searchable fields.
+
+    Collections opt in with Search.register(collection, fields). For every field Database writes keep a
+    <field>_search array next to it holding the value lower-cased, stripped of diacritics and punctuation, starting
+    at each word, e.g. name 'Nakato Ámina-Rose' is stored as name_search ['nakato amina rose', 'amina rose', 'rose'].
+    A search is an anchored, case-sensitive regex on those arrays, which MongoDB answers from the index bounds
+    instead of scanning the collection, and only one page of matches is read.
+    """
+    fields = {}
+
+    @staticmethod
+    def register(collection: str, fields: list):
+        Search.fields[collection] = list(fields)
+        # the arrays only serve the index, Database leaves them out of reads
+        Database.hidden_fields.setdefault(collection, set()).update(Search.search_field(field) for field in fields)
+        IndexRegistry.register(collection, [Search.search_field(field) for field in fields])
+
+    @staticmethod
+    def search_field(field: str) -> str:
+        return f"{field}_search"
+
+    @staticmethod
+    def normalise(value) -> str:
+        text = unicodedata.normalize('NFKD', str(value))
+        text = ''.join(character for character in text if not unicodedata.combining(character))
+        return ' '.join(re.sub(r'[\W_]+', ' ', text.casefold()).split())
+
+    @staticmethod
+    def prefixes(value) -> list:
+        if value is None:
+            return []
+        words = Search.normalise(value).split()[:SEARCH_MAX_WORDS]
+        return [' '.join(words[index:]) for index in range(len(words))]
+
+    @staticmethod
+    def prepare(collection: str, item: dict):
+        """
+        Database write hook, adds the <field>_search arrays for the searchable fields present in item.
+        """
+        for field in Search.fields.get(collection, []):
+            if field in item:
+                item[Search.search_field(field)] = Search.prefixes(item[field])
+
+    @staticmethod
+    def query(collection: str, search_text: str, fields: list = None) -> list:
+        """
+        The search as a query_list_of_dictionaries (any field may match), empty when there is nothing to search.
+        """
+        text = Search.normalise(search_text)
+        if not text:
+            return []
+        pattern = re.compile(f"^{re.escape(text)}")
+        return [{Search.search_field(field): pattern} for field in fields or Search.fields.get(collection, [])]
+
+    @staticmethod
+    async def results(collection: str, search_text: str, page_number: int, page_size: int, url: str,
+                      joins: list = None, exclude_list_of_dictionaries: list = None, projection: dict = None) -> dict:
+        """
+        One page of matches in the paginated_results shape, page_size is capped at SEARCH_MAX_PAGE_SIZE.
+        """
+        page_number = max(int(page_number), 1)
+        page_size = min(max(int(page_size), 1), SEARCH_MAX_PAGE_SIZE)
+        url = f"{url}/{quote(str(search_text), safe='')}"
+
+        query = Search.query(collection, search_text)
+        if not query:
+            return {
+                'results': [],
+                'pagination_details': await Pagination.pagination_details(page_number, page_size, 0, url),
+                'total_count': 0,
+            }
+
+        results = await Pagination.paginated_results(page_number, page_size, collection, url, query,
+                                                     exclude_list_of_dictionaries, projection=projection)
+        await Join.attach_many(results['results'], joins or [])
+        return results
+
+    @staticmethod
+    async def backfill():
+        """
+        Add the <field>_search arrays to documents written before their collection was registered.
+        """
+        for collection, fields in Search.fields.items():
+            try:
+                collection_object = await Database.create_collection_object(collection)
+                if collection_object is None:
+                    continue
+                query = {'$or': [{field: {'$exists': True}, Search.search_field(field): {'$exists': False}}
+                                 for field in fields]}
+                cursor = collection_object.find(query, {field: 1 for field in fields})
+                operations = []
+                updated = 0
+                async for item in cursor:
+                    Search.prepare(collection, item)
+                    search_fields = {Search.search_field(field): item[Search.search_field(field)] for field in fields
+                                     if field in item}
+                    operations.append(UpdateOne({'_id': item['_id']}, {'$set': search_fields}))
+                    if len(operations) >= BACKFILL_BATCH_SIZE:
+                        await collection_object.bulk_write(operations, ordered=False)
+                        updated += len(operations)
+                        operations = []
+                if operations:
+                    await collection_object.bulk_write(operations, ordered=False)
+                    updated += len(operations)
+                if updated:
+                    ReferenceCache.invalidate(collection)
+                    logger.info(f"Search backfilled {updated} {collection} documents")
+            except Exception as e:
+                logger.error(f"Error in Search.backfill for {collection}: {e}")
+
+
+Database.write_hooks.append(Search.prepare)
@@ -0,0 +1,187 @@
+import mimetypes
+import os
+import time
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, StreamingResponse
+from loguru import logger
+from app.core.file_response import StoredFileResponse
+from app.config import UPLOADED_FILES_DIRECTORY, UPLOAD_CHUNK_SIZE, STORAGE_BACKEND, S3_BUCKET, S3_ENDPOINT_URL, \
+    S3_ACCESS_KEY_ID, S3_SECRET_ACCESS_KEY, S3_REGION, S3_PRESIGNED_READS, S3_PRESIGN_EXPIRY
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+# S3 multipart parts must be at least 5 MB, except the last one
+S3_PART_SIZE = 8 * 1024 * 1024
+
+
+class LocalStorage:
+    """
+    Blobs as files under a local directory, the key is the path relative to it.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, key: str):
+        path = self.directory.joinpath(key).resolve()
+        if self.directory not in path.parents:
+            raise ValueError(f"{key} is outside the storage directory")
+        return path
+
+    async def exists(self, key: str) -> bool:
+        return await run_in_threadpool(self.path(key).is_file)
+
+    async def write(self, key: str, source, size: int, content_type: str):
+        await run_in_threadpool(self._write, key, source)
+
+    def _write(self, key: str, source):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # written under a temporary name first so a half written blob is never served
+        temporary_path = path.with_name(f"{path.name}.{os.getpid()}.{time.monotonic_ns()}.part")
+        source.seek(0)
+        try:
+            with open(temporary_path, 'wb') as output:
+                while True:
+                    chunk = source.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    output.write(chunk)
+            os.replace(temporary_path, path)
+        except Exception:
+            temporary_path.unlink(missing_ok=True)
+            raise
+
+    async def read_bytes(self, key: str) -> bytes:
+        return await run_in_threadpool(self.path(key).read_bytes)
+
+    async def stat(self, key: str):
+        try:
+            stat = await run_in_threadpool(os.stat, self.path(key))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return {'size': stat.st_size, 'mtime': stat.st_mtime, 'content_type': None}
+
+    async def response(self, key: str, stat: dict, headers: dict, content_type: str = None,
+                       byte_range: tuple = None):
+        path = self.path(key)
+        return StoredFileResponse(path, stat['size'], headers, content_type or mimetypes.guess_type(path.name)[0],
+                                  byte_range)
+
+
+class S3Storage:
+    """
+    Blobs as objects in an S3 compatible bucket (AWS S3, MinIO ...), shared by every API node.
+
+    Writes stream the source in S3_PART_SIZE multipart parts, reads either redirect to a presigned URL or are
+    proxied through the API in chunks. boto3 is blocking, every call runs on the thread pool.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: str = None, access_key_id: str = None,
+                 secret_access_key: str = None, region: str = None, presigned_reads: bool = True,
+                 presign_expiry: int = 3600):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 needs boto3, install it with pip install boto3")
+        self.bucket = bucket
+        self.presigned_reads = presigned_reads
+        self.presign_expiry = presign_expiry
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, aws_access_key_id=access_key_id,
+                                   aws_secret_access_key=secret_access_key, region_name=region)
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await run_in_threadpool(self.client.head_object, Bucket=self.bucket, Key=key)
+            return True
+        except self.client.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    async def write(self, key: str, source, size: int, content_type: str):
+        await run_in_threadpool(self._write, key, source, size, content_type)
+
+    def _write(self, key: str, source, size: int, content_type: str):
+        source.seek(0)
+        if size <= S3_PART_SIZE:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=source.read(), ContentType=content_type)
+            return
+
+        upload = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, ContentType=content_type)
+        parts = []
+        try:
+            while True:
+                chunk = source.read(S3_PART_SIZE)
+                if not chunk:
+                    break
+                part = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload['UploadId'],
+                                               PartNumber=len(parts) + 1, Body=chunk)
+                parts.append({'PartNumber': len(parts) + 1, 'ETag': part['ETag']})
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload['UploadId'],
+                                                  MultipartUpload={'Parts': parts})
+        except Exception:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload['UploadId'])
+            raise
+
+    async def read_bytes(self, key: str) -> bytes:
+        response = await run_in_threadpool(self.client.get_object, Bucket=self.bucket, Key=key)
+        return await run_in_threadpool(response['Body'].read)
+
+    async def stat(self, key: str):
+        try:
+            head = await run_in_threadpool(self.client.head_object, Bucket=self.bucket, Key=key)
+        except self.client.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return {'size': head['ContentLength'], 'mtime': head['LastModified'].timestamp(),
+                'content_type': head.get('ContentType')}
+
+    async def response(self, key: str, stat: dict, headers: dict, content_type: str = None,
+                       byte_range: tuple = None):
+        if self.presigned_reads:
+            # the bucket answers the range and conditional headers of the redirected request itself
+            url = await run_in_threadpool(self.client.generate_presigned_url, 'get_object',
+                                          Params={'Bucket': self.bucket, 'Key': key},
+                                          ExpiresIn=self.presign_expiry)
+            return RedirectResponse(url)
+
+        parameters = {'Bucket': self.bucket, 'Key': key}
+        headers = dict(headers)
+        if byte_range:
+            parameters['Range'] = f"bytes={byte_range[0]}-{byte_range[1]}"
+            headers['content-range'] = f"bytes {byte_range[0]}-{byte_range[1]}/{stat['size']}"
+        response = await run_in_threadpool(self.client.get_object, **parameters)
+        headers['content-length'] = str(response['ContentLength'])
+        return StreamingResponse(self.stream(response['Body']), status_code=206 if byte_range else 200,
+                                 media_type=content_type or stat.get('content_type'), headers=headers)
+
+    async def stream(self, body):
+        try:
+            while True:
+                chunk = await run_in_threadpool(body.read, UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+
+class Storage:
+    """
+    The storage backend chosen by STORAGE_BACKEND, 'local' (the default) or 's3'.
+    """
+    backend = None
+
+    @staticmethod
+    def get():
+        if Storage.backend is None:
+            if STORAGE_BACKEND == 's3':
+                Storage.backend = S3Storage(S3_BUCKET, S3_ENDPOINT_URL, S3_ACCESS_KEY_ID, S3_SECRET_ACCESS_KEY,
+                                            S3_REGION, S3_PRESIGNED_READS, S3_PRESIGN_EXPIRY)
+            else:
+                Storage.backend = LocalStorage(UPLOADED_FILES_DIRECTORY)
+            logger.info(f"Uploads are stored with {type(Storage.backend).__name__}")
+        return Storage.backend
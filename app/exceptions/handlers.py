@@ -1,4 +1,4 @@
-from fastapi.responses import JSONResponse
+from app.core.json_response import EnvelopeResponse
 from app.core.form import Form
 from app.core.database import Database
 
@@ -10,7 +10,7 @@ async def not_found_exception_handler(request, exc):
         f'The requested resource <br/> ( {request.url.path} )<br/>does not exist',
         'error',
         'danger')
-    return JSONResponse(response, status_code=404)
+    return EnvelopeResponse(response, status_code=404)
 
 
 async def method_not_allowed_exception_handler(request, exc):
@@ -20,7 +20,7 @@ async def method_not_allowed_exception_handler(request, exc):
         'The requested HTTP method (post/get method) was not found',
         'error',
         'danger')
-    return JSONResponse(response, status_code=405)
+    return EnvelopeResponse(response, status_code=405)
 
 
 async def internal_server_error_exception_handler(request, exc):
@@ -30,4 +30,4 @@ async def internal_server_error_exception_handler(request, exc):
         'An error happened during the execution, check server logs for more information',
         'error',
         'danger')
-    return JSONResponse(response, status_code=500)
+    return EnvelopeResponse(response, status_code=500)
@@ -1,20 +1,29 @@
 from fastapi import FastAPI
 from app.core.logger import logger
 from app.core.form import Form
-from fastapi.staticfiles import StaticFiles
-from app.middleware.check_database_live_status import check_database_connection
+from app.core.database import Database
+from app.core.health import DatabaseHealth
+from app.core.indexes import IndexRegistry
+from app.core.search import Search
+from app.core.dashboard import DashboardSummary
+from app.core.qrcode import Qrcode
+from app.core.storage import Storage
+from app.core.images import ImageDerivatives
+from app.core.json_response import EnvelopeResponse
+from app.middleware.check_database_live_status import DatabaseLiveStatusMiddleware
+from app.middleware.dataloader import DataLoaderMiddleware
 from app.exceptions.handlers import not_found_exception_handler, method_not_allowed_exception_handler, \
     internal_server_error_exception_handler
 from app.routes import router as api_router
 from app.config import configure_cors, configure_logging
 
-app = FastAPI(debug=True)
-app.mount("/uploaded_files", StaticFiles(directory="uploaded_files"), name="uploaded_files")
+app = FastAPI(debug=True, default_response_class=EnvelopeResponse)
 
 configure_logging()
 configure_cors(app)
 
-app.middleware("http")(check_database_connection)
+app.add_middleware(DatabaseLiveStatusMiddleware)
+app.add_middleware(DataLoaderMiddleware)
 
 # app.add_exception_handler(500, check_database_connection)
 app.add_exception_handler(404, not_found_exception_handler)
@@ -24,6 +33,25 @@ app.add_exception_handler(500, internal_server_error_exception_handler)
 app.include_router(api_router)
 
 
+@app.on_event("startup")
+async def startup():
+    # fail at boot rather than on the first upload when the configured backend can't be used
+    Storage.get()
+    await Database.warm_collection_registry()
+    await IndexRegistry.apply_all()
+    await Search.backfill()
+    await DatabaseHealth.start()
+    await DashboardSummary.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await DatabaseHealth.stop()
+    await DashboardSummary.stop()
+    Qrcode.shutdown_worker_pool()
+    ImageDerivatives.shutdown_worker_pool()
+
+
 @app.get("/")
 async def welcome():
     return await Form.return_response(
@@ -1,8 +1,10 @@
-from fastapi import Request
-from fastapi.responses import JSONResponse
-from app.core.database import Database
+from app.core.json_response import EnvelopeResponse
+from app.core.health import DatabaseHealth
 from app.core.form import Form
 
+# routes that never touch the database, served even when the database is down
+DATABASE_FREE_PATHS = ['/uploaded_files', '/country', '/docs', '/redoc', '/openapi.json']
+
 
 async def handle_database_connection_error():
     response = await Form.return_response(
@@ -12,12 +14,27 @@ async def handle_database_connection_error():
         'error',
         'danger'
     )
-    return JSONResponse(status_code=500, content=response)
+    return EnvelopeResponse(status_code=500, content=response)
+
+
+def is_database_free(path: str) -> bool:
+    return path == '/' or any(path == prefix or path.startswith(f"{prefix}/") for prefix in DATABASE_FREE_PATHS)
+
+
+class DatabaseLiveStatusMiddleware:
+    """
+    Answer with a database error while the DatabaseHealth circuit is open.
+
+    A plain ASGI middleware rather than app.middleware("http"), so requests for database free paths such as
+    /uploaded_files go straight to the app without their body being relayed through an extra task and stream,
+    and file responses keep access to the server's zero-copy send extensions.
+    """
 
+    def __init__(self, app):
+        self.app = app
 
-async def check_database_connection(request: Request, call_next):
-    connection = await Database.is_live()
-    if connection:
-        return await call_next(request)
-    else:
-        return await handle_database_connection_error()
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or is_database_free(scope['path']) or DatabaseHealth.is_available():
+            return await self.app(scope, receive, send)
+        response = await handle_database_connection_error()
+        await response(scope, receive, send)
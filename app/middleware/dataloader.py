@@ -0,0 +1,21 @@
+from app.core.dataloader import DataLoader, current_loader
+
+
+class DataLoaderMiddleware:
+    """
+    Give every HTTP request its own DataLoader, on request.state.loader and as the current_loader.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        loader = DataLoader()
+        scope.setdefault('state', {})['loader'] = loader
+        token = current_loader.set(loader)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_loader.reset(token)
@@ -1,6 +1,7 @@
 
 from fastapi import APIRouter
-from app.routes import users, prospects, products, categories, country, stages, agents, enrollment, participants, events, materials
+from app.routes import users, prospects, products, categories, country, stages, agents, enrollment, participants, events, materials, admin, \
+    qrcodes, dashboard, uploaded_files
 
 router = APIRouter()
 router.include_router(users.router)
@@ -16,3 +17,7 @@ router.include_router(country.router)
 router.include_router(stages.router)
 router.include_router(agents.router)
 router.include_router(enrollment.router)
+router.include_router(admin.router)
+router.include_router(qrcodes.router)
+router.include_router(dashboard.router)
+router.include_router(uploaded_files.router)
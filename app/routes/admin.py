@@ -0,0 +1,40 @@
+from fastapi import APIRouter
+from loguru import logger
+from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
+from app.core.indexes import IndexRegistry
+
+router = APIRouter(prefix="/admin", route_class=EnvelopeRoute)
+
+
+class AdminService:
+
+    @staticmethod
+    async def indexes():
+        """
+        Report declared indexes that are missing on the server and indexes that have never been used.
+        """
+        try:
+            return await Form.return_response(
+                False,
+                'Success',
+                "Index report retrieved successfully",
+                'success',
+                'success',
+                server_data=await IndexRegistry.report()
+            )
+        except Exception as e:
+            logger.error(f"Failed to fetch index report: {e}")
+            return await Form.return_response(
+                True,
+                'Failed to fetch index report',
+                str(e),
+                'error',
+                'danger'
+            )
+
+
+# Routes
+@router.get('/indexes')
+async def indexes():
+    return await AdminService.indexes()
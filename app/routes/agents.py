@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Request
 from loguru import logger
 from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
 from app.core.form_validation import FormValidation
 from app.core.database import Database
+from app.core.counts import Counts
 from app.core.pagination import Pagination
 from app.core.generic import Generic
+from app.core.export import Export
+from app.core.dashboard import DashboardSummary
 from app.routes.users import User
 from app.routes.stages import StageService
 from app.routes.products import ProductService
@@ -12,11 +16,15 @@ from app.routes.products import ProductService
 logger.add("logs/agents.log", colorize=True, backtrace=True, diagnose=True, format="{time} {level} {message}",
            rotation="1 MB", level="INFO")
 
-router = APIRouter(prefix="/agents")
+router = APIRouter(prefix="/agents", route_class=EnvelopeRoute)
 
 
 class AgentService:
     collection_name = 'user'
+    export_columns = [
+        ('ID', 'id'), ('Name', 'fullname'), ('Phone', 'phone_number'), ('Email', 'email'), ('Role', 'default_role'),
+        ('Account', 'read_status'), ('Date created', 'date_created.date')
+    ]
 
     @staticmethod
     async def paginated_report(page_number: int, page_size: int):
@@ -30,7 +38,8 @@ class AgentService:
                 page_size,
                 AgentService.collection_name,
                 '/dashboard/admin/agents/report',
-                exclude_list_of_dictionaries=[{'default_role': 'root'}]
+                exclude_list_of_dictionaries=[{'default_role': 'root'}],
+                projection={'password': 0}
             )
 
             for agent in agents.get('results', []):
@@ -88,7 +97,7 @@ class AgentService:
     @staticmethod
     async def agents_select_array():
         try:
-            agents = await AgentService.all_agents()
+            agents = await AgentService.all_agents(await Generic.select_array_projection('id', 'fullname'))
             select_array = await Generic.create_select_array(agents, 'id', 'fullname')
 
             return await Form.return_response(
@@ -110,11 +119,11 @@ class AgentService:
             )
 
     @staticmethod
-    async def all_agents():
+    async def all_agents(projection: dict = None):
         try:
             return await Database.fetch_many_items(AgentService.collection_name, exclude_list_of_dictionaries=[
                 {'default_role': 'root'}
-            ])
+            ], projection=projection if projection else {'password': 0})
 
         except Exception as e:
             logger.error(f"Failed to fetch agents: {e}")
@@ -131,7 +140,7 @@ class AgentService:
         try:
             return await Database.fetch_one_item(AgentService.collection_name, query_list_of_dictionaries=[
                 {'id': agent_id}
-            ])
+            ], projection={'password': 0})
 
         except Exception as e:
             logger.error(f"Failed to fetch agents: {e}")
@@ -143,10 +152,20 @@ class AgentService:
                 'danger'
             )
 
+    @staticmethod
+    async def export(export_format: str):
+        """
+        Stream every agent record as CSV or NDJSON.
+        """
+        return await Export.response(export_format, AgentService.collection_name, 'agents',
+                                     AgentService.export_columns,
+                                     exclude_list_of_dictionaries=[{'default_role': 'root'}],
+                                     projection={'password': 0})
+
     @staticmethod
     async def count():
         try:
-            return await Database.count_items(AgentService.collection_name, exclude_list_of_dictionaries=[
+            return await Counts.count(AgentService.collection_name, exclude_list_of_dictionaries=[
                 {'default_role': 'root'}
             ])
         except Exception as e:
@@ -164,7 +183,7 @@ class AgentService:
         try:
             return await Database.fetch_many_items(AgentService.collection_name, limit=limit, exclude_list_of_dictionaries=[
                 {'default_role': 'root'}
-            ])
+            ], projection={'password': 0})
 
         except Exception as e:
             logger.error(f"Failed to fetch agents: {e}")
@@ -215,6 +234,12 @@ class AgentService:
         )
 
 
+DashboardSummary.register('agents', AgentService.collection_name,
+                          ['_id', 'id', 'fullname', 'phone_number', 'email', 'default_role', 'read_status',
+                           'date_created'],
+                          exclude_list_of_dictionaries=[{'default_role': 'root'}], label_column='fullname')
+
+
 @router.get('/paginated_report/{page_number}/{page_size}')
 async def get_paginated_report(page_number: int, page_size: int):
     return await AgentService.paginated_report(page_number, page_size)
@@ -230,6 +255,11 @@ async def count():
     return await AgentService.count()
 
 
+@router.get('/export/{export_format}')
+async def export(export_format: str):
+    return await AgentService.export(export_format)
+
+
 @router.get('/agents_select_array')
 async def get_agents_select_array():
     return await AgentService.agents_select_array()
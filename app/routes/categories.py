@@ -1,20 +1,28 @@
 from fastapi import APIRouter, Request
 from loguru import logger
 from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
 from app.core.form_validation import FormValidation
 from app.core.database import Database
+from app.core.dashboard import DashboardSummary
+from app.core.counts import Counts
+from app.core.indexes import IndexRegistry
+from app.core.cache import ReferenceCache
 from app.core.pagination import Pagination
 from app.core.generic import Generic
+from app.core.join import Join
 from app.routes.users import User
 
 logger.add("logs/categories.log", colorize=True, backtrace=True, diagnose=True, format="{time} {level} {message}",
            rotation="1 MB", level="INFO")
 
-router = APIRouter(prefix="/categories")
+router = APIRouter(prefix="/categories", route_class=EnvelopeRoute)
 
 
 class CategoryService:
     collection_name = 'category'
+    agent_join = {'collection': User.collection_name, 'local_column': 'user_id', 'display_column': 'fullname',
+                  'as': 'agent'}
 
     @staticmethod
     async def add(request: Request):
@@ -69,11 +77,9 @@ class CategoryService:
                 '/dashboard/admin/categories/report'
             )
 
-            users = await User.all_users()
+            await Join.attach(categories.get('results', []), CategoryService.agent_join)
 
             for category in categories.get('results', []):
-                category['agent'] = next((user['fullname'] for user in users if int(user['id']) == int(category['user_id'])), 'Error')
-
                 if category:
                     table_values.append([
                         category.get('name', '---'),
@@ -119,7 +125,7 @@ class CategoryService:
     @staticmethod
     async def select_array():
         try:
-            categories = await CategoryService.all_categories()
+            categories = await CategoryService.all_categories(await Generic.select_array_projection('id', 'name'))
             select_array = await Generic.create_select_array(categories, 'id', 'name')
 
             return await Form.return_response(
@@ -141,9 +147,9 @@ class CategoryService:
             )
 
     @staticmethod
-    async def all_categories():
+    async def all_categories(projection: dict = None):
         try:
-            return await Database.fetch_many_items(CategoryService.collection_name)
+            return await Database.fetch_many_items(CategoryService.collection_name, projection=projection)
         except Exception as e:
             logger.error(f"Failed to fetch categories: {e}")
             return await Form.return_response(
@@ -157,7 +163,7 @@ class CategoryService:
     @staticmethod
     async def count():
         try:
-            return await Database.count_items(CategoryService.collection_name)
+            return await Counts.count(CategoryService.collection_name)
         except Exception as e:
             logger.error(f"Failed to fetch categories count: {e}")
             return await Form.return_response(
@@ -183,6 +189,13 @@ class CategoryService:
             )
 
 
+IndexRegistry.register(CategoryService.collection_name, ['name'])
+ReferenceCache.configure(CategoryService.collection_name, ttl=300)
+DashboardSummary.register('categories', CategoryService.collection_name,
+                          ['_id', 'id', 'name', 'user_id', 'date_created'], group_by={'agent': ('user_id', 'agents')},
+                          label_column='name')
+
+
 # Routes
 @router.post('/add')
 async def add_category(request: Request):
@@ -2,9 +2,10 @@
 from fastapi import APIRouter
 from app.core.generic import Generic
 from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
 
 # expose api endpoint
-router = APIRouter(prefix='/country')
+router = APIRouter(prefix='/country', route_class=EnvelopeRoute)
 
 # list of all country codes
 countryCodes = [
@@ -0,0 +1,40 @@
+from fastapi import APIRouter
+from loguru import logger
+from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
+from app.core.dashboard import DashboardSummary
+
+router = APIRouter(prefix="/dashboard", route_class=EnvelopeRoute)
+
+
+class DashboardService:
+
+    @staticmethod
+    async def summary():
+        """
+        Totals, per agent and per stage counts and the latest items of every dashboard section, served from memory.
+        """
+        try:
+            return await Form.return_response(
+                False,
+                'Success',
+                "Dashboard summary retrieved successfully",
+                'success',
+                'success',
+                server_data=await DashboardSummary.summary()
+            )
+        except Exception as e:
+            logger.error(f"Failed to fetch dashboard summary: {e}")
+            return await Form.return_response(
+                True,
+                'Failed to fetch dashboard summary',
+                str(e),
+                'error',
+                'danger'
+            )
+
+
+# Routes
+@router.get('/summary')
+async def summary():
+    return await DashboardService.summary()
@@ -3,19 +3,31 @@
 from fastapi import APIRouter, Request
 from loguru import logger
 from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
 from app.core.form_validation import FormValidation
 from app.core.database import Database
+from app.core.dashboard import DashboardSummary
+from app.core.counts import Counts
+from app.core.indexes import IndexRegistry
+from app.core.search import Search
 from app.core.pagination import Pagination
 from app.core.generic import Generic
+from app.core.export import Export
+from app.core.bulk_import import BulkImport
 
 logger.add("logs/enrollment.log", colorize=True, backtrace=True, diagnose=True, format="{time} {level} {message}",
            rotation="1 MB", level="INFO")
 
-router = APIRouter(prefix="/enrollment")
+router = APIRouter(prefix="/enrollment", route_class=EnvelopeRoute)
 
 
 class EnrollmentService:
     collection_name = 'enrollment'
+    export_columns = [
+        ('ID', 'id'), ('Name', 'name'), ('Address', 'address'), ('Age', 'age'), ('HIV Status', 'hiv_status'),
+        ('DOB', 'dob'), ('Village', 'village'), ('Schooling Status', 'schooling_status'),
+        ('Date created', 'date_created.date')
+    ]
 
     @staticmethod
     async def add(request: Request):
@@ -62,7 +74,16 @@ class EnrollmentService:
             )
 
     @staticmethod
-    async def paginated_report(page_number: int, page_size: int):
+    async def import_file(request: Request):
+        """
+        Import a CSV / Excel spreadsheet of enrollment in the background.
+        """
+        return await BulkImport.start(request, EnrollmentService.collection_name, [
+            'name', 'address', 'age', 'hiv_status', 'dob', 'village', 'schooling_status'
+        ], ['name'], {'status': 'active'})
+
+    @staticmethod
+    async def paginated_report(page_number: int, page_size: int, after_id: int = None, before_id: int = None):
         """
         Generate a paginated report of participants.
         """
@@ -75,7 +96,9 @@ class EnrollmentService:
                 page_number,
                 page_size,
                 EnrollmentService.collection_name,
-                '/dashboard/admin/enrollment/report'
+                '/dashboard/admin/enrollment/report',
+                after_id=after_id,
+                before_id=before_id
             )
 
             for participant in participants.get('results', []):
@@ -130,7 +153,7 @@ class EnrollmentService:
         Get an array of participants for selection.
         """
         try:
-            participants = await EnrollmentService.all_participants()
+            participants = await EnrollmentService.all_participants(await Generic.select_array_projection('id', 'name'))
             select_array = await Generic.create_select_array(participants, 'id', 'name')
 
             return await Form.return_response(
@@ -152,12 +175,12 @@ class EnrollmentService:
             )
 
     @staticmethod
-    async def all_participants():
+    async def all_participants(projection: dict = None):
         """
         Retrieve all participants.
         """
         try:
-            return await Database.fetch_many_items(EnrollmentService.collection_name)
+            return await Database.fetch_many_items(EnrollmentService.collection_name, projection=projection)
         except Exception as e:
             logger.error(f"Failed to fetch participants: {e}")
             return await Form.return_response(
@@ -168,13 +191,47 @@ class EnrollmentService:
                 'danger'
             )
 
+    @staticmethod
+    async def export(export_format: str):
+        """
+        Stream every enrollment record as CSV or NDJSON.
+        """
+        return await Export.response(export_format, EnrollmentService.collection_name, 'enrollment',
+                                     EnrollmentService.export_columns)
+
+    @staticmethod
+    async def search(search_text: str, page_number: int, page_size: int):
+        """
+        Prefix search on name, one page at a time.
+        """
+        try:
+            enrollment = await Search.results(EnrollmentService.collection_name, search_text, page_number, page_size,
+                                              '/enrollment/search')
+            return await Form.return_response(
+                False,
+                'Success',
+                f"{format(enrollment['total_count'], ',')} enrollment records match '{search_text}'",
+                'success',
+                'success',
+                server_data=enrollment
+            )
+        except Exception as e:
+            logger.error(f"Failed to search enrollment records: {e}")
+            return await Form.return_response(
+                True,
+                'Failed to search enrollment records',
+                str(e),
+                'error',
+                'danger'
+            )
+
     @staticmethod
     async def count():
         """
         Get the total count of participants.
         """
         try:
-            return await Database.count_items(EnrollmentService.collection_name)
+            return await Counts.count(EnrollmentService.collection_name)
         except Exception as e:
             logger.error(f"Failed to fetch participants count: {e}")
             return await Form.return_response(
@@ -203,17 +260,43 @@ class EnrollmentService:
             )
 
 
+IndexRegistry.register(EnrollmentService.collection_name, ['name'])
+Search.register(EnrollmentService.collection_name, ['name'])
+DashboardSummary.register('enrollment', EnrollmentService.collection_name,
+                          ['_id', 'id', 'name', 'village', 'hiv_status', 'date_created'])
+
+
 # Routes
 @router.post('/add')
 async def add_participant(request: Request):
     return await EnrollmentService.add(request)
 
 
+@router.post('/import')
+async def import_file(request: Request):
+    return await EnrollmentService.import_file(request)
+
+
+@router.get('/import/{job_id}')
+async def import_status(job_id: int):
+    return await BulkImport.status(job_id)
+
+
 @router.get('/paginated_report/{page_number}/{page_size}')
 async def get_paginated_report(page_number: int, page_size: int):
     return await EnrollmentService.paginated_report(page_number, page_size)
 
 
+@router.get('/paginated_report/after/{last_id}/{page_size}')
+async def get_paginated_report_after(last_id: int, page_size: int):
+    return await EnrollmentService.paginated_report(1, page_size, after_id=last_id)
+
+
+@router.get('/paginated_report/before/{first_id}/{page_size}')
+async def get_paginated_report_before(first_id: int, page_size: int):
+    return await EnrollmentService.paginated_report(1, page_size, before_id=first_id)
+
+
 @router.get('/latest/{limit}')
 async def get_latest_participants(limit: int):
     return await EnrollmentService.latest_participants(int(limit))
@@ -224,6 +307,16 @@ async def count():
     return await EnrollmentService.count()
 
 
+@router.get('/export/{export_format}')
+async def export(export_format: str):
+    return await EnrollmentService.export(export_format)
+
+
+@router.get('/search/{search_text}/{page_number}/{page_size}')
+async def search(search_text: str, page_number: int, page_size: int):
+    return await EnrollmentService.search(search_text, page_number, page_size)
+
+
 @router.get('/participants_select_array')
 async def get_participants_select_array():
     return await EnrollmentService.participants_select_array()
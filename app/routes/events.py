@@ -1,21 +1,33 @@
 from fastapi import APIRouter, Request
 from loguru import logger
 from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
 from app.core.form_validation import FormValidation
 from app.core.database import Database
+from app.core.dashboard import DashboardSummary
+from app.core.counts import Counts
+from app.core.indexes import IndexRegistry
 from app.core.pagination import Pagination
 from app.core.generic import Generic
+from app.core.export import Export
+from app.core.join import Join
 from app.routes.users import User
 from app.routes.stages import StageService
 
 logger.add("logs/events.log", colorize=True, backtrace=True, diagnose=True, format="{time} {level} {message}",
            rotation="1 MB", level="INFO")
 
-router = APIRouter(prefix="/events")
+router = APIRouter(prefix="/events", route_class=EnvelopeRoute)
 
 
 class EventService:
     collection_name = 'event'
+    agent_join = {'collection': User.collection_name, 'local_column': 'user_id', 'display_column': 'fullname',
+                  'as': 'agent'}
+    export_columns = [
+        ('ID', 'id'), ('Title', 'title'), ('Type', 'event_type'), ('Start', 'start_date'), ('End', 'end_date'),
+        ('Location', 'location'), ('Status', 'status'), ('Author', 'agent'), ('Date created', 'date_created.date')
+    ]
 
     @staticmethod
     async def check_existing_event(field, value):
@@ -83,12 +95,9 @@ class EventService:
                 '/dashboard/admin/events/report'
             )
 
-            users = await User.all_users()
+            await Join.attach(events.get('results', []), EventService.agent_join)
 
             for event in events.get('results', []):
-                event['agent'] = next(
-                    (user['fullname'] for user in users if int(user['id']) == int(event['user_id'])), 'Error')
-
                 if event:
                     table_values.append([
                         event.get('title', '---'),
@@ -138,7 +147,7 @@ class EventService:
     @staticmethod
     async def events_select_array():
         try:
-            events = await EventService.all_events()
+            events = await EventService.all_events(await Generic.select_array_projection('id', 'title'))
             select_array = await Generic.create_select_array(events, 'id', 'title')
 
             return await Form.return_response(
@@ -160,9 +169,9 @@ class EventService:
             )
 
     @staticmethod
-    async def all_events():
+    async def all_events(projection: dict = None):
         try:
-            events = await Database.fetch_many_items(EventService.collection_name)
+            events = await Database.fetch_many_items(EventService.collection_name, projection=projection)
 
             return events
 
@@ -176,10 +185,19 @@ class EventService:
                 'danger'
             )
 
+    @staticmethod
+    async def export(export_format: str):
+        """
+        Stream every event record as CSV or NDJSON.
+        """
+        return await Export.response(export_format, EventService.collection_name, 'events',
+                                     EventService.export_columns,
+                                     [EventService.agent_join])
+
     @staticmethod
     async def count():
         try:
-            return await Database.count_items(EventService.collection_name)
+            return await Counts.count(EventService.collection_name)
         except Exception as e:
             logger.error(f"Failed to fetch events count: {e}")
             return await Form.return_response(
@@ -193,12 +211,8 @@ class EventService:
     @staticmethod
     async def latest_events(limit: int):
         try:
-            users = await User.all_users()
             events = await Database.fetch_many_items(EventService.collection_name, limit=limit)
-
-            for event in events:
-                event['agent'] = next(
-                    (user['fullname'] for user in users if int(user['id']) == int(event['user_id'])), 'Error')
+            await Join.attach(events, EventService.agent_join)
 
             return events
 
@@ -213,6 +227,12 @@ class EventService:
             )
 
 
+IndexRegistry.register(EventService.collection_name, ['title', 'start_date', 'location'])
+DashboardSummary.register('events', EventService.collection_name,
+                          ['_id', 'id', 'title', 'start_date', 'location', 'user_id', 'date_created'],
+                          group_by={'agent': ('user_id', 'agents')})
+
+
 # Routes
 @router.post('/add')
 async def add_event(request: Request):
@@ -234,6 +254,11 @@ async def count():
     return await EventService.count()
 
 
+@router.get('/export/{export_format}')
+async def export(export_format: str):
+    return await EventService.export(export_format)
+
+
 @router.get('/events_select_array')
 async def get_events_select_array():
     return await EventService.events_select_array()
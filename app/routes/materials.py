@@ -1,20 +1,33 @@
 from fastapi import APIRouter, Request
 from loguru import logger
 from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
 from app.core.form_validation import FormValidation
 from app.core.database import Database
+from app.core.dashboard import DashboardSummary
+from app.core.counts import Counts
+from app.core.indexes import IndexRegistry
 from app.core.pagination import Pagination
 from app.core.generic import Generic
+from app.core.export import Export
+from app.core.join import Join
 from app.routes.users import User
 
 logger.add("logs/materials.log", colorize=True, backtrace=True, diagnose=True, format="{time} {level} {message}",
            rotation="1 MB", level="INFO")
 
-router = APIRouter(prefix="/materials")
+router = APIRouter(prefix="/materials", route_class=EnvelopeRoute)
 
 
 class MaterialService:
     collection_name = 'material'
+    agent_join = {'collection': User.collection_name, 'local_column': 'user_id', 'display_column': 'fullname',
+                  'as': 'agent'}
+    export_columns = [
+        ('ID', 'id'), ('Title', 'title'), ('Type', 'material_type'), ('Format', 'material_format'),
+        ('Audience', 'target_audience'), ('Publication date', 'publication_date'), ('URL', 'url'),
+        ('Registered by', 'agent'), ('Date created', 'date_created.date')
+    ]
 
     @staticmethod
     async def check_existing_material(field, value):
@@ -80,12 +93,9 @@ class MaterialService:
                 '/dashboard/admin/materials/report'
             )
 
-            users = await User.all_users()
+            await Join.attach(materials.get('results', []), MaterialService.agent_join)
 
             for material in materials.get('results', []):
-                material['agent'] = next(
-                    (user['fullname'] for user in users if int(user['id']) == int(material['user_id'])), 'Error')
-
                 if material:
                     table_values.append([
                         material.get('title', '---'),
@@ -134,7 +144,7 @@ class MaterialService:
     @staticmethod
     async def materials_select_array():
         try:
-            materials = await MaterialService.all_materials()
+            materials = await MaterialService.all_materials(await Generic.select_array_projection('id', 'title'))
             select_array = await Generic.create_select_array(materials, 'id', 'title')
 
             return await Form.return_response(
@@ -156,9 +166,9 @@ class MaterialService:
             )
 
     @staticmethod
-    async def all_materials():
+    async def all_materials(projection: dict = None):
         try:
-            materials = await Database.fetch_many_items(MaterialService.collection_name)
+            materials = await Database.fetch_many_items(MaterialService.collection_name, projection=projection)
 
             return materials
 
@@ -172,10 +182,19 @@ class MaterialService:
                 'danger'
             )
 
+    @staticmethod
+    async def export(export_format: str):
+        """
+        Stream every material record as CSV or NDJSON.
+        """
+        return await Export.response(export_format, MaterialService.collection_name, 'materials',
+                                     MaterialService.export_columns,
+                                     [MaterialService.agent_join])
+
     @staticmethod
     async def count():
         try:
-            return await Database.count_items(MaterialService.collection_name)
+            return await Counts.count(MaterialService.collection_name)
         except Exception as e:
             logger.error(f"Failed to fetch materials count: {e}")
             return await Form.return_response(
@@ -189,12 +208,8 @@ class MaterialService:
     @staticmethod
     async def latest_materials(limit: int):
         try:
-            users = await User.all_users()
             materials = await Database.fetch_many_items(MaterialService.collection_name, limit=limit)
-
-            for material in materials:
-                material['agent'] = next(
-                    (user['fullname'] for user in users if int(user['id']) == int(material['user_id'])), 'Error')
+            await Join.attach(materials, MaterialService.agent_join)
 
             return materials
 
@@ -209,6 +224,12 @@ class MaterialService:
             )
 
 
+IndexRegistry.register(MaterialService.collection_name, ['title', 'publication_date', 'url'])
+DashboardSummary.register('materials', MaterialService.collection_name,
+                          ['_id', 'id', 'title', 'publication_date', 'url', 'user_id', 'date_created'],
+                          group_by={'agent': ('user_id', 'agents')})
+
+
 # Routes
 @router.post('/add')
 async def add_material(request: Request):
@@ -230,6 +251,11 @@ async def count():
     return await MaterialService.count()
 
 
+@router.get('/export/{export_format}')
+async def export(export_format: str):
+    return await MaterialService.export(export_format)
+
+
 @router.get('/materials_select_array')
 async def get_materials_select_array():
     return await MaterialService.materials_select_array()
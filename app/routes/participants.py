@@ -1,21 +1,37 @@
 from fastapi import APIRouter, Request
 from loguru import logger
 from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
 from app.core.form_validation import FormValidation
 from app.core.database import Database
+from app.core.dashboard import DashboardSummary
+from app.core.counts import Counts
+from app.core.indexes import IndexRegistry
+from app.core.search import Search
 from app.core.pagination import Pagination
 from app.core.generic import Generic
+from app.core.export import Export
+from app.core.bulk_import import BulkImport
+from app.core.join import Join
 from app.routes.users import User
 from app.routes.stages import StageService
 
 logger.add("logs/participants.log", colorize=True, backtrace=True, diagnose=True, format="{time} {level} {message}",
            rotation="1 MB", level="INFO")
 
-router = APIRouter(prefix="/participants")
+router = APIRouter(prefix="/participants", route_class=EnvelopeRoute)
 
 
 class ParticipantService:
     collection_name = 'participant'
+    agent_join = {'collection': User.collection_name, 'local_column': 'user_id', 'display_column': 'fullname',
+                  'as': 'agent'}
+    stage_join = {'collection': StageService.collection_name, 'local_column': 'stage_id', 'display_column': 'name',
+                  'as': 'stage'}
+    export_columns = [
+        ('ID', 'id'), ('Name', 'name'), ('HIV Status', 'hiv_status'), ('Email', 'email'), ('Phone', 'phone'),
+        ('Stage', 'stage'), ('Registered by', 'agent'), ('Date created', 'date_created.date')
+    ]
 
     @staticmethod
     async def check_existing_participant(field, value):
@@ -68,28 +84,30 @@ class ParticipantService:
             )
 
     @staticmethod
-    async def paginated_report(page_number: int, page_size: int):
+    async def import_file(request: Request):
+        """
+        Import a CSV / Excel spreadsheet of participants in the background.
+        """
+        return await BulkImport.start(request, ParticipantService.collection_name, ['name', 'user_id', 'hiv_status'], ['name', 'email', 'phone'], {'status': 'active'})
+
+    @staticmethod
+    async def paginated_report(page_number: int, page_size: int, after_id: int = None, before_id: int = None):
         try:
             table_title = "Participants"
             table_columns = ['Name', 'HIV Status', 'Manage', 'Registered by', 'Time']
             table_values = []
 
-            participants = await Pagination.paginated_results(
+            participants = await Pagination.aggregated_results(
                 page_number,
                 page_size,
                 ParticipantService.collection_name,
-                '/dashboard/admin/participants/report'
+                '/dashboard/admin/participants/report',
+                joins=[ParticipantService.agent_join, ParticipantService.stage_join],
+                after_id=after_id,
+                before_id=before_id
             )
 
-            users = await User.all_users()
-            stages = await StageService.all_stages()
-
             for participant in participants.get('results', []):
-                participant['agent'] = next(
-                    (user['fullname'] for user in users if int(user['id']) == int(participant['user_id'])), 'Error')
-                participant['stage'] = next(
-                    (stage['name'] for stage in stages if int(stage['id']) == int(participant['stage_id'])), 'Error')
-
                 button = f"""
                           <a href="/dashboard/admin/participants/{participant.get('id')}/profile"
                             class="rounded-full h-6 btn border border-primary font-medium text-primary hover:bg-primary hover:text-white focus:bg-primary focus:text-white active:bg-primary/90 dark:border-accent dark:text-accent-light dark:hover:bg-accent dark:hover:text-white dark:focus:bg-accent dark:focus:text-white dark:active:bg-accent/90"
@@ -145,7 +163,7 @@ class ParticipantService:
     @staticmethod
     async def participants_select_array():
         try:
-            participants = await ParticipantService.all_participants()
+            participants = await ParticipantService.all_participants(await Generic.select_array_projection('id', 'name'))
             select_array = await Generic.create_select_array(participants, 'id', 'name')
 
             return await Form.return_response(
@@ -167,9 +185,9 @@ class ParticipantService:
             )
 
     @staticmethod
-    async def all_participants():
+    async def all_participants(projection: dict = None):
         try:
-            participants = await Database.fetch_many_items(ParticipantService.collection_name)
+            participants = await Database.fetch_many_items(ParticipantService.collection_name, projection=projection)
 
             return participants
 
@@ -183,10 +201,46 @@ class ParticipantService:
                 'danger'
             )
 
+    @staticmethod
+    async def export(export_format: str):
+        """
+        Stream every participant record as CSV or NDJSON.
+        """
+        return await Export.response(export_format, ParticipantService.collection_name, 'participants',
+                                     ParticipantService.export_columns,
+                                     [ParticipantService.agent_join, ParticipantService.stage_join])
+
+    @staticmethod
+    async def search(search_text: str, page_number: int, page_size: int):
+        """
+        Prefix search on name, email, phone, one page at a time.
+        """
+        try:
+            participants = await Search.results(ParticipantService.collection_name, search_text, page_number, page_size,
+                                                '/participants/search',
+                                                joins=[ParticipantService.agent_join, ParticipantService.stage_join])
+            return await Form.return_response(
+                False,
+                'Success',
+                f"{format(participants['total_count'], ',')} participants match '{search_text}'",
+                'success',
+                'success',
+                server_data=participants
+            )
+        except Exception as e:
+            logger.error(f"Failed to search participants: {e}")
+            return await Form.return_response(
+                True,
+                'Failed to search participants',
+                str(e),
+                'error',
+                'danger'
+            )
+
     @staticmethod
     async def count():
         try:
-            return await Database.count_items(ParticipantService.collection_name)
+            return await Counts.count(ParticipantService.collection_name)
         except Exception as e:
             logger.error(f"Failed to fetch participants count: {e}")
             return await Form.return_response(
@@ -200,12 +254,8 @@ class ParticipantService:
     @staticmethod
     async def latest_participants(limit: int):
         try:
-            users = await User.all_users()
             participants = await Database.fetch_many_items(ParticipantService.collection_name, limit=limit)
-
-            for participant in participants:
-                participant['agent'] = next(
-                    (user['fullname'] for user in users if int(user['id']) == int(participant['user_id'])), 'Error')
+            await Join.attach(participants, ParticipantService.agent_join)
 
             return participants
 
@@ -275,17 +325,44 @@ class ParticipantService:
         )
 
 
+IndexRegistry.register(ParticipantService.collection_name, ['name', 'email', 'phone'])
+Search.register(ParticipantService.collection_name, ['name', 'email', 'phone'])
+DashboardSummary.register('participants', ParticipantService.collection_name,
+                          ['_id', 'id', 'name', 'hiv_status', 'user_id', 'stage_id', 'date_created'],
+                          group_by={'agent': ('user_id', 'agents'), 'stage': ('stage_id', 'stages')})
+
+
 # Routes
 @router.post('/add')
 async def add_participant(request: Request):
     return await ParticipantService.add(request)
 
 
+@router.post('/import')
+async def import_file(request: Request):
+    return await ParticipantService.import_file(request)
+
+
+@router.get('/import/{job_id}')
+async def import_status(job_id: int):
+    return await BulkImport.status(job_id)
+
+
 @router.get('/paginated_report/{page_number}/{page_size}')
 async def get_paginated_report(page_number: int, page_size: int):
     return await ParticipantService.paginated_report(page_number, page_size)
 
 
+@router.get('/paginated_report/after/{last_id}/{page_size}')
+async def get_paginated_report_after(last_id: int, page_size: int):
+    return await ParticipantService.paginated_report(1, page_size, after_id=last_id)
+
+
+@router.get('/paginated_report/before/{first_id}/{page_size}')
+async def get_paginated_report_before(first_id: int, page_size: int):
+    return await ParticipantService.paginated_report(1, page_size, before_id=first_id)
+
+
 @router.get('/latest/{limit}')
 async def get_latest_participants(limit: int):
     return await ParticipantService.latest_participants(int(limit))
@@ -296,6 +373,16 @@ async def count():
     return await ParticipantService.count()
 
 
+@router.get('/export/{export_format}')
+async def export(export_format: str):
+    return await ParticipantService.export(export_format)
+
+
+@router.get('/search/{search_text}/{page_number}/{page_size}')
+async def search(search_text: str, page_number: int, page_size: int):
+    return await ParticipantService.search(search_text, page_number, page_size)
+
+
 @router.get('/participants_select_array')
 async def get_participants_select_array():
     return await ParticipantService.participants_select_array()
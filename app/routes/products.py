@@ -1,21 +1,36 @@
 from fastapi import APIRouter, Request
 from loguru import logger
 from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
 from app.core.form_validation import FormValidation
 from app.core.database import Database
+from app.core.dashboard import DashboardSummary
+from app.core.counts import Counts
+from app.core.indexes import IndexRegistry
+from app.core.cache import ReferenceCache
 from app.core.pagination import Pagination
 from app.core.generic import Generic
+from app.core.export import Export
+from app.core.join import Join
 from app.routes.users import User
 from app.routes.categories import CategoryService
 
 logger.add("logs/products.log", colorize=True, backtrace=True, diagnose=True, format="{time} {level} {message}",
            rotation="1 MB", level="INFO")
 
-router = APIRouter(prefix="/products")
+router = APIRouter(prefix="/products", route_class=EnvelopeRoute)
 
 
 class ProductService:
     collection_name = 'product'
+    agent_join = {'collection': User.collection_name, 'local_column': 'user_id', 'display_column': 'fullname',
+                  'as': 'agent'}
+    category_join = {'collection': CategoryService.collection_name, 'local_column': 'category_id',
+                     'display_column': 'name', 'as': 'category'}
+    export_columns = [
+        ('ID', 'id'), ('Name', 'name'), ('Category', 'category'), ('Registered by', 'agent'),
+        ('Date created', 'date_created.date')
+    ]
 
     @staticmethod
     async def add(request: Request):
@@ -70,13 +85,10 @@ class ProductService:
                 '/dashboard/admin/products/report'
             )
 
-            users = await User.all_users()
-            categories = await CategoryService.all_categories()
+            await Join.attach_many(products.get('results', []),
+                                   [ProductService.agent_join, ProductService.category_join])
 
             for product in products.get('results', []):
-                product['agent'] = next((user['fullname'] for user in users if int(user['id']) == int(product['user_id'])), 'Error')
-                product['category'] = next((category['name'] for category in categories if int(category['id']) == int(product['category_id'])), 'Error')
-
                 if product:
                     table_values.append([
                         product.get('name', '---'),
@@ -123,7 +135,7 @@ class ProductService:
     @staticmethod
     async def products_select_array():
         try:
-            products = await ProductService.all_products()
+            products = await ProductService.all_products(await Generic.select_array_projection('id', 'name'))
             select_array = await Generic.create_select_array(products, 'id', 'name')
 
             return await Form.return_response(
@@ -145,14 +157,11 @@ class ProductService:
             )
 
     @staticmethod
-    async def all_products():
+    async def all_products(projection: dict = None):
         try:
-            products = await Database.fetch_many_items(ProductService.collection_name)
-
-            categories = await CategoryService.all_categories()
-
-            for product in products:
-                product['category'] = next((category['name'] for category in categories if int(category['id']) == int(product['category_id'])), 'Error')
+            products = await Database.fetch_many_items(ProductService.collection_name, projection=projection)
+            if projection is None:
+                await Join.attach(products, ProductService.category_join)
 
             return products
 
@@ -166,10 +175,19 @@ class ProductService:
                 'danger'
             )
 
+    @staticmethod
+    async def export(export_format: str):
+        """
+        Stream every product record as CSV or NDJSON.
+        """
+        return await Export.response(export_format, ProductService.collection_name, 'products',
+                                     ProductService.export_columns,
+                                     [ProductService.agent_join, ProductService.category_join])
+
     @staticmethod
     async def count():
         try:
-            return await Database.count_items(ProductService.collection_name)
+            return await Counts.count(ProductService.collection_name)
         except Exception as e:
             logger.error(f"Failed to fetch products count: {e}")
             return await Form.return_response(
@@ -183,11 +201,8 @@ class ProductService:
     @staticmethod
     async def latest_products(limit: int):
         try:
-            categories = await CategoryService.all_categories()
             products = await Database.fetch_many_items(ProductService.collection_name, limit=limit)
-
-            for product in products:
-                product['category'] = next((category['name'] for category in categories if int(category['id']) == int(product['category_id'])), 'Error')
+            await Join.attach(products, ProductService.category_join)
 
             return products
 
@@ -202,6 +217,13 @@ class ProductService:
             )
 
 
+IndexRegistry.register(ProductService.collection_name, ['name'])
+ReferenceCache.configure(ProductService.collection_name, ttl=300)
+DashboardSummary.register('products', ProductService.collection_name,
+                          ['_id', 'id', 'name', 'category_id', 'user_id', 'date_created'],
+                          group_by={'agent': ('user_id', 'agents')}, label_column='name')
+
+
 # Routes
 @router.post('/add')
 async def add_product(request: Request):
@@ -223,6 +245,11 @@ async def count():
     return await ProductService.count()
 
 
+@router.get('/export/{export_format}')
+async def export(export_format: str):
+    return await ProductService.export(export_format)
+
+
 @router.get('/products_select_array')
 async def get_products_select_array():
     return await ProductService.products_select_array()
@@ -1,10 +1,17 @@
 from fastapi import APIRouter, Request
 from loguru import logger
 from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
 from app.core.form_validation import FormValidation
 from app.core.database import Database
+from app.core.dashboard import DashboardSummary
+from app.core.counts import Counts
+from app.core.indexes import IndexRegistry
+from app.core.search import Search
 from app.core.pagination import Pagination
 from app.core.generic import Generic
+from app.core.export import Export
+from app.core.join import Join
 from app.routes.users import User
 from app.routes.stages import StageService
 from app.routes.products import ProductService
@@ -12,11 +19,21 @@ from app.routes.products import ProductService
 logger.add("logs/prospects.log", colorize=True, backtrace=True, diagnose=True, format="{time} {level} {message}",
            rotation="1 MB", level="INFO")
 
-router = APIRouter(prefix="/prospects")
+router = APIRouter(prefix="/prospects", route_class=EnvelopeRoute)
 
 
 class ProspectService:
     collection_name = 'prospect'
+    agent_join = {'collection': User.collection_name, 'local_column': 'user_id', 'display_column': 'fullname',
+                  'as': 'agent'}
+    stage_join = {'collection': StageService.collection_name, 'local_column': 'stage_id', 'display_column': 'name',
+                  'as': 'stage'}
+    product_join = {'collection': ProductService.collection_name, 'local_column': 'product_id',
+                    'display_column': 'name', 'as': 'product'}
+    export_columns = [
+        ('ID', 'id'), ('Name', 'name'), ('Email', 'email'), ('Phone', 'phone'), ('Product', 'product'),
+        ('Stage', 'stage'), ('Registered by', 'agent'), ('Date created', 'date_created.date')
+    ]
 
     @staticmethod
     async def check_existing_prospect(field, value):
@@ -75,26 +92,19 @@ class ProspectService:
             table_columns = ['Name', 'Product', 'Stage', 'Registered by', 'Time']
             table_values = []
 
-            prospects = await Pagination.paginated_results(
+            prospects = await Pagination.aggregated_results(
                 page_number,
                 page_size,
                 ProspectService.collection_name,
-                '/dashboard/admin/prospects/report'
+                '/dashboard/admin/prospects/report',
+                joins=[
+                    ProspectService.agent_join,
+                    ProspectService.stage_join,
+                    ProspectService.product_join
+                ]
             )
 
-            users = await User.all_users()
-            products = await ProductService.all_products()
-            stages = await StageService.all_stages()
-
             for prospect in prospects.get('results', []):
-                prospect['agent'] = next(
-                    (user['fullname'] for user in users if int(user['id']) == int(prospect['user_id'])), 'Error')
-                prospect['stage'] = next(
-                    (stage['name'] for stage in stages if int(stage['id']) == int(prospect['stage_id'])), 'Error')
-                prospect['product'] = next(
-                    (product['name'] for product in products if int(product['id']) == int(prospect['product_id'])),
-                    'Error')
-
                 if prospect:
                     table_values.append([
                         prospect.get('name', '---'),
@@ -142,7 +152,7 @@ class ProspectService:
     @staticmethod
     async def prospects_select_array():
         try:
-            prospects = await ProspectService.all_prospects()
+            prospects = await ProspectService.all_prospects(await Generic.select_array_projection('id', 'name'))
             select_array = await Generic.create_select_array(prospects, 'id', 'name')
 
             return await Form.return_response(
@@ -164,15 +174,12 @@ class ProspectService:
             )
 
     @staticmethod
-    async def all_prospects():
+    async def all_prospects(projection: dict = None):
         try:
-            prospects = await Database.fetch_many_items(ProspectService.collection_name)
+            prospects = await Database.fetch_many_items(ProspectService.collection_name, projection=projection)
 
-            categories = await CategoryService.all_categories()
-
-            for prospect in prospects:
-                prospect['category'] = next((category['name'] for category in categories if
-                                             int(category['id']) == int(prospect['category_id'])), 'Error')
+            if projection is None:
+                await Join.attach(prospects, ProspectService.product_join)
 
             return prospects
 
@@ -186,10 +193,47 @@ class ProspectService:
                 'danger'
             )
 
+    @staticmethod
+    async def export(export_format: str):
+        """
+        Stream every prospect record as CSV or NDJSON.
+        """
+        return await Export.response(export_format, ProspectService.collection_name, 'prospects',
+                                     ProspectService.export_columns,
+                                     [ProspectService.agent_join, ProspectService.stage_join, ProspectService.product_join])
+
+    @staticmethod
+    async def search(search_text: str, page_number: int, page_size: int):
+        """
+        Prefix search on name, email, phone, one page at a time.
+        """
+        try:
+            prospects = await Search.results(ProspectService.collection_name, search_text, page_number, page_size,
+                                             '/prospects/search',
+                                             joins=[ProspectService.agent_join, ProspectService.stage_join,
+                                                    ProspectService.product_join])
+            return await Form.return_response(
+                False,
+                'Success',
+                f"{format(prospects['total_count'], ',')} prospects match '{search_text}'",
+                'success',
+                'success',
+                server_data=prospects
+            )
+        except Exception as e:
+            logger.error(f"Failed to search prospects: {e}")
+            return await Form.return_response(
+                True,
+                'Failed to search prospects',
+                str(e),
+                'error',
+                'danger'
+            )
+
     @staticmethod
     async def count():
         try:
-            return await Database.count_items(ProspectService.collection_name)
+            return await Counts.count(ProspectService.collection_name)
         except Exception as e:
             logger.error(f"Failed to fetch prospects count: {e}")
             return await Form.return_response(
@@ -203,12 +247,8 @@ class ProspectService:
     @staticmethod
     async def latest_prospects(limit: int):
         try:
-            users = await User.all_users()
             prospects = await Database.fetch_many_items(ProspectService.collection_name, limit=limit)
-
-            for prospect in prospects:
-                prospect['agent'] = next(
-                    (user['fullname'] for user in users if int(user['id']) == int(prospect['user_id'])), 'Error')
+            await Join.attach(prospects, ProspectService.agent_join)
 
             return prospects
 
@@ -223,6 +263,13 @@ class ProspectService:
             )
 
 
+IndexRegistry.register(ProspectService.collection_name, ['name', 'email', 'phone'])
+Search.register(ProspectService.collection_name, ['name', 'email', 'phone'])
+DashboardSummary.register('prospects', ProspectService.collection_name,
+                          ['_id', 'id', 'name', 'email', 'phone', 'user_id', 'stage_id', 'product_id', 'date_created'],
+                          group_by={'agent': ('user_id', 'agents'), 'stage': ('stage_id', 'stages')})
+
+
 # Routes
 @router.post('/add')
 async def add_prospect(request: Request):
@@ -244,6 +291,16 @@ async def count():
     return await ProspectService.count()
 
 
+@router.get('/export/{export_format}')
+async def export(export_format: str):
+    return await ProspectService.export(export_format)
+
+
+@router.get('/search/{search_text}/{page_number}/{page_size}')
+async def search(search_text: str, page_number: int, page_size: int):
+    return await ProspectService.search(search_text, page_number, page_size)
+
+
 @router.get('/prospects_select_array')
 async def get_prospects_select_array():
     return await ProspectService.prospects_select_array()
@@ -0,0 +1,138 @@
+import tempfile
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from loguru import logger
+from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
+from app.core.form_validation import FormValidation
+from app.core.database import Database
+from app.core.qrcode import Qrcode, QRCODE_SPRITE_LIMIT
+from app.routes.participants import ParticipantService
+from app.routes.events import EventService
+from app.routes.enrollment import EnrollmentService
+from app.routes.prospects import ProspectService
+from app.routes.agents import AgentService
+
+router = APIRouter(prefix="/qrcode", route_class=EnvelopeRoute)
+
+QRCODE_BULK_LIMIT = 5000
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+class QrcodeService:
+    entity_collections = {
+        'participant': ParticipantService.collection_name,
+        'event': EventService.collection_name,
+        'enrollment': EnrollmentService.collection_name,
+        'prospect': ProspectService.collection_name,
+        'agent': AgentService.collection_name,
+    }
+    # left out when every entity of a type is requested, as in the listings of that type
+    entity_exclusions = {
+        'agent': [{'default_role': 'root'}],
+    }
+    output_formats = {
+        'zip': (Qrcode.package_zip, 'application/zip', 'zip'),
+        'pdf': (Qrcode.package_pdf, 'application/pdf', 'pdf'),
+        'sprite': (Qrcode.package_sprite, 'image/png', 'png'),
+    }
+
+    @staticmethod
+    async def parse_entity_ids(entity_ids) -> list:
+        # entity_ids comes in as a single id or a comma separated list of ids
+        return [int(entity_id) for entity_id in str(entity_ids).split(',') if entity_id.strip().isdigit()]
+
+    @staticmethod
+    async def bulk(request: Request):
+        """
+        Render id QR codes for a list of entity ids, or for every entity of entity_type when no ids are given,
+        and stream them back as a ZIP of PNGs, a multi-page PDF or a single PNG sprite sheet.
+        """
+        try:
+            form_data = await Form.extract_form_input(request)
+            validation_message = await FormValidation.require_inputs(form_data, ['entity_type'])
+            if validation_message != 'valid_inputs':
+                return validation_message
+
+            entity_type = form_data['entity_type']
+            output_format = form_data.get('output_format', 'zip')
+            if entity_type not in QrcodeService.entity_collections or output_format not in QrcodeService.output_formats:
+                return await Form.return_response(
+                    True,
+                    'Validation Error',
+                    f"entity_type must be one of {', '.join(QrcodeService.entity_collections)} and output_format "
+                    f"one of {', '.join(QrcodeService.output_formats)}",
+                    'error',
+                    'danger'
+                )
+
+            entity_ids = await QrcodeService.parse_entity_ids(form_data.get('entity_ids', ''))
+            if not entity_ids:
+                entities = await Database.fetch_many_items(
+                    QrcodeService.entity_collections[entity_type],
+                    exclude_list_of_dictionaries=QrcodeService.entity_exclusions.get(entity_type),
+                    projection={'_id': 0, 'id': 1},
+                    time_elapsed=False
+                )
+                entity_ids = [entity['id'] for entity in entities]
+
+            limit = QRCODE_SPRITE_LIMIT if output_format == 'sprite' else QRCODE_BULK_LIMIT
+            if not entity_ids or len(entity_ids) > limit:
+                return await Form.return_response(
+                    True,
+                    'Validation Error',
+                    f"Between 1 and {format(limit, ',')} QR codes can be generated at once as a {output_format}, "
+                    f"{format(len(entity_ids), ',')} were requested",
+                    'error',
+                    'danger'
+                )
+
+            bulk_qrcodes = await Qrcode.generate_bulk_id_qrcodes(entity_type, entity_ids)
+            if not bulk_qrcodes['files']:
+                return await Form.return_response(
+                    True,
+                    'Failed to generate QR codes',
+                    f"None of the {format(len(entity_ids), ',')} QR codes could be generated, check server logs "
+                    f"for more information",
+                    'error',
+                    'danger'
+                )
+
+            packager, media_type, extension = QrcodeService.output_formats[output_format]
+            output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+            await run_in_threadpool(packager, bulk_qrcodes['files'], entity_type, output)
+            await run_in_threadpool(output.seek, 0)
+
+            stats = bulk_qrcodes['stats']
+            logger.info(f"Bulk QR codes for {entity_type}: {stats}")
+            headers = {'Content-Disposition': f'attachment; filename="{entity_type}_qrcodes.{extension}"'}
+            headers.update({f"X-Qrcode-{key.replace('_', '-').title()}": str(value) for key, value in stats.items()})
+            return StreamingResponse(QrcodeService.stream_file(output), media_type=media_type, headers=headers)
+
+        except Exception as e:
+            logger.error(f"Failed to generate QR codes: {e}")
+            return await Form.return_response(
+                True,
+                'Failed to generate QR codes',
+                str(e),
+                'error',
+                'danger'
+            )
+
+    @staticmethod
+    async def stream_file(output):
+        try:
+            while True:
+                chunk = await run_in_threadpool(output.read, STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            output.close()
+
+
+# Routes
+@router.post('/bulk')
+async def bulk(request: Request):
+    return await QrcodeService.bulk(request)
@@ -1,20 +1,28 @@
 from fastapi import APIRouter, Request
 from loguru import logger
 from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
 from app.core.form_validation import FormValidation
 from app.core.database import Database
+from app.core.dashboard import DashboardSummary
+from app.core.counts import Counts
+from app.core.indexes import IndexRegistry
+from app.core.cache import ReferenceCache
 from app.core.pagination import Pagination
 from app.core.generic import Generic
+from app.core.join import Join
 from app.routes.users import User
 
 logger.add("logs/stages.log", colorize=True, backtrace=True, diagnose=True, format="{time} {level} {message}",
            rotation="1 MB", level="INFO")
 
-router = APIRouter(prefix="/stages")
+router = APIRouter(prefix="/stages", route_class=EnvelopeRoute)
 
 
 class StageService:
     collection_name = 'stage'
+    agent_join = {'collection': User.collection_name, 'local_column': 'user_id', 'display_column': 'fullname',
+                  'as': 'agent'}
 
     @staticmethod
     async def add(request: Request):
@@ -69,11 +77,9 @@ class StageService:
                 '/dashboard/admin/stages/report'
             )
 
-            users = await User.all_users()
+            await Join.attach(stages.get('results', []), StageService.agent_join)
 
             for stage in stages.get('results', []):
-                stage['agent'] = next((user['fullname'] for user in users if int(user['id']) == int(stage['user_id'])), 'Error')
-
                 if stage:
                     table_values.append([
                         stage.get('name', '---'),
@@ -119,7 +125,7 @@ class StageService:
     @staticmethod
     async def select_array():
         try:
-            stages = await StageService.all_stages()
+            stages = await StageService.all_stages(await Generic.select_array_projection('id', 'name'))
             select_array = await Generic.create_select_array(stages, 'id', 'name')
 
             return await Form.return_response(
@@ -141,9 +147,9 @@ class StageService:
             )
 
     @staticmethod
-    async def all_stages():
+    async def all_stages(projection: dict = None):
         try:
-            return await Database.fetch_many_items(StageService.collection_name)
+            return await Database.fetch_many_items(StageService.collection_name, projection=projection)
         except Exception as e:
             logger.error(f"Failed to fetch stages: {e}")
             return await Form.return_response(
@@ -157,7 +163,7 @@ class StageService:
     @staticmethod
     async def count():
         try:
-            return await Database.count_items(StageService.collection_name)
+            return await Counts.count(StageService.collection_name)
         except Exception as e:
             logger.error(f"Failed to fetch stages count: {e}")
             return await Form.return_response(
@@ -183,6 +189,12 @@ class StageService:
             )
 
 
+IndexRegistry.register(StageService.collection_name, ['name'])
+ReferenceCache.configure(StageService.collection_name, ttl=300)
+DashboardSummary.register('stages', StageService.collection_name, ['_id', 'id', 'name', 'user_id', 'date_created'],
+                          group_by={'agent': ('user_id', 'agents')}, label_column='name')
+
+
 # Routes
 @router.post('/add')
 async def add_stage(request: Request):
@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Request, Response
+from loguru import logger
+from app.core.form import Form
+from app.core.json_response import EnvelopeRoute, EnvelopeResponse
+from app.core.storage import Storage
+from app.core.file_response import FileCaching
+from app.core.images import ImageDerivatives, IMAGE_DERIVATIVE_SIZES
+
+router = APIRouter(prefix="/uploaded_files", route_class=EnvelopeRoute)
+
+
+class UploadedFileService:
+
+    @staticmethod
+    async def serve(request: Request, key: str, size: str = None):
+        """
+        Serve an uploaded file from the storage backend, without touching the database.
+        With ?size= the precomputed WebP variant of a photo is served, or the original while it is being generated.
+        Conditional (If-None-Match) and single range (Range / If-Range) requests are answered from the file's
+        validators, content addressed files are cached by clients as immutable.
+        """
+        try:
+            storage = Storage.get()
+            candidates = []
+            if size is not None:
+                if size not in IMAGE_DERIVATIVE_SIZES:
+                    return EnvelopeResponse(status_code=400, content=await Form.return_response(
+                        True,
+                        'Validation Error',
+                        f"size must be one of {', '.join(IMAGE_DERIVATIVE_SIZES)}",
+                        'error',
+                        'danger'
+                    ))
+                candidates.append((ImageDerivatives.derivative_key(key, size), 'image/webp'))
+            candidates.append((key, None))
+
+            for index, (candidate_key, content_type) in enumerate(candidates):
+                stat = await storage.stat(candidate_key)
+                if stat is None:
+                    continue
+                # the original standing in for a variant that isn't ready yet must not be cached for good
+                headers = FileCaching.headers(candidate_key, stat, immutable=index == 0)
+                if FileCaching.not_modified(request.headers, headers):
+                    return Response(status_code=304, headers=headers)
+
+                byte_range = None
+                if request.headers.get('range') and FileCaching.range_applies(request.headers, headers):
+                    try:
+                        byte_range = FileCaching.parse_range(request.headers['range'], stat['size'])
+                    except ValueError:
+                        return Response(status_code=416, headers={**headers,
+                                                                  'content-range': f"bytes */{stat['size']}"})
+                return await storage.response(candidate_key, stat, headers, content_type, byte_range)
+
+            message = f"{key} does not exist"
+        except ValueError as e:
+            message = str(e)
+        except Exception as e:
+            logger.error(f"Failed to serve uploaded file {key}: {e}")
+            message = f"{key} could not be read"
+        return EnvelopeResponse(status_code=404, content=await Form.return_response(
+            True,
+            'File not found',
+            message,
+            'error',
+            'danger'
+        ))
+
+
+# Routes
+@router.api_route('/{key:path}', methods=['GET', 'HEAD'])
+async def serve(request: Request, key: str, size: str = None):
+    return await UploadedFileService.serve(request, key, size)
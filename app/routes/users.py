@@ -4,11 +4,16 @@ from argon2 import PasswordHasher
 
 # dependencies
 from app.core.form import Form
+from app.core.json_response import EnvelopeRoute
 from app.core.form_validation import FormValidation
 from app.core.database import Database
+from app.core.indexes import IndexRegistry
+from app.core.search import Search
+from app.core.cache import ReferenceCache
+from app.core.dataloader import DataLoader
 from app.core.passwordutils import PasswordUtils
 
-router = APIRouter(prefix="/user")
+router = APIRouter(prefix="/user", route_class=EnvelopeRoute)
 
 
 class User:
@@ -104,7 +109,7 @@ class User:
         form_data['other_names'] = " ".join(full_name[2:])
         form_data['name_abbreviation'] = await Form.create_initials(form_data['fullname'])
 
-        form_data['password'] = PasswordUtils.hash_password(form_data['password'])
+        form_data['password'] = await PasswordUtils.hash_password_async(form_data['password'])
         del form_data['confirm_password']
 
         form_data['phone_number'] = f"{form_data['phone_country_code']}{form_data['phone'].lstrip('0')}" if \
@@ -132,12 +137,13 @@ class User:
             'danger')
 
     @staticmethod
-    async def all_users():
+    async def all_users(projection: dict = None):
         """
-        Retrieve all users.
+        Retrieve all users, password hashes are left out unless a projection asks otherwise.
         """
         try:
-            return await Database.fetch_many_items(User.collection_name)
+            return await Database.fetch_many_items(User.collection_name, time_elapsed=False,
+                                                   projection=projection if projection else {'password': 0})
         except Exception as e:
             return await User.handle_exception('Failed to retrieve users', str(e))
 
@@ -162,7 +168,7 @@ class User:
                     'error',
                     'danger')
 
-            valid_password = PasswordUtils.verify_password(form_data['password'], user.get('password', ''))
+            valid_password = await PasswordUtils.verify_password_async(form_data['password'], user.get('password', ''))
             if not valid_password:
                 return await Form.return_response(
                     True,
@@ -171,6 +177,12 @@ class User:
                     'error',
                     'danger')
 
+            # upgrade hashes made with older argon2 parameters while we still have the plain password
+            if PasswordUtils.check_needs_rehash(user.get('password', '')):
+                await Database.update_one_item(User.collection_name, {
+                    'password': await PasswordUtils.hash_password_async(form_data['password'])
+                }, 'id', user['id'], True)
+
             user.pop('password', None)
             return await Form.return_response(
                 False,
@@ -189,7 +201,31 @@ class User:
         """
         Get user details by user id.
         """
-        return await Database.fetch_one_item_by_integer_id(User.collection_name, user_id)
+        return await Database.fetch_one_item_by_integer_id(User.collection_name, user_id, {'password': 0})
+
+    @staticmethod
+    async def search(search_text: str, page_number: int, page_size: int):
+        """
+        Prefix search on fullname, email and phone, password hashes are left out.
+        """
+        try:
+            users = await Search.results(User.collection_name, search_text, page_number, page_size, '/user/search',
+                                         projection={'password': 0})
+            return await Form.return_response(
+                False,
+                'Success',
+                f"{format(users['total_count'], ',')} users match '{search_text}'",
+                'success',
+                'success',
+                server_data=users)
+        except Exception as e:
+            return await User.handle_exception('Failed to search users', str(e))
+
+
+IndexRegistry.register(User.collection_name, ['phone', 'email', 'phone_number'])
+Search.register(User.collection_name, ['fullname', 'email', 'phone'])
+ReferenceCache.configure(User.collection_name, ttl=60, max_entries=5000)
+DataLoader.configure(User.collection_name, projection={'password': 0})
 
 
 # Create account for a new user
@@ -202,3 +238,9 @@ async def create_user(request: Request):
 @router.post('/login')
 async def login_user(request: Request):
     return await User.login(request)
+
+
+# Search users
+@router.get('/search/{search_text}/{page_number}/{page_size}')
+async def search_users(search_text: str, page_number: int, page_size: int):
+    return await User.search(search_text, page_number, page_size)
@@ -0,0 +1,117 @@
+"""
+Micro-benchmark of EnvelopeResponse against the path FastAPI takes for a returned dict: jsonable_encoder followed
+by the stdlib json encoder of JSONResponse.
+
+Run from the repository root with: python -m benchmarks.json_response [repetitions]
+"""
+import datetime
+import json
+import sys
+import timeit
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.core.json_response import EnvelopeResponse, orjson
+
+
+def envelope(server_data):
+    # the shape returned by Form.return_response
+    return {
+        "server_error": False,
+        "server_message": 'Success',
+        "message_detail": 'Items retrieved successfully',
+        "response_status": 'success',
+        "response_color": 'success',
+        "response_action": '',
+        "server_data": server_data,
+    }
+
+
+def date_created(now: datetime.datetime) -> dict:
+    # a trimmed DateFunctions.add_current_timestamp column
+    timestamp = now.strftime("%Y-%m-%d %H:%M:%S:%f")
+    return {
+        'timestamp': timestamp,
+        'epoch': int(now.timestamp()),
+        'timestamp_id': now.strftime("%Y%m%d%H%M%S%f"),
+        'date': timestamp[:-3],
+        'formatted_date_short': now.strftime("%d %b %Y"),
+        'formatted_date_long': now.strftime("%d %B %Y"),
+        'formatted_date_time': now.strftime("%I:%M %p"),
+        'day': now.day,
+        'day_name_long': now.strftime("%A"),
+        'hour': now.hour,
+        'minute': now.minute,
+        'month_number': now.month,
+        'year': now.year,
+    }
+
+
+def participant(index: int, now: datetime.datetime, object_ids: bool) -> dict:
+    return {
+        '_id': ObjectId() if object_ids else str(ObjectId()),
+        'id': 10000 - index,
+        'fullname': f"Participant {index}",
+        'email': f"participant{index}@example.com",
+        'phone': f"+256 7{index:08d}",
+        'country': 'Uganda',
+        'user_id': 3,
+        'agent': 'Field Agent',
+        'photo': f"uploaded_files/3f/a1/{'3fa1' * 16}.jpg",
+        'photo_derivatives': {size: f"uploaded_files/3f/a1/{'3fa1' * 16}.{size}.webp"
+                              for size in ('avatar', 'thumb', 'medium', 'full')},
+        'date_created': now if object_ids else date_created(now),
+        'time_elapsed': '3 hours ago',
+    }
+
+
+def payloads() -> dict:
+    now = datetime.datetime.now()
+    pagination_details = {'page_number': 1, 'page_size': 50, 'total_count': 12842, 'total_pages': 257,
+                          'url': '/dashboard/admin/participants/report'}
+    return {
+        # /<module>/paginated_report/1/50
+        'paginated_report': envelope({
+            'title': 'Participants',
+            'sub_title': 'Participants registered from field',
+            'columns': ['Name', 'Registered by', 'Time'],
+            'values': [[f"Participant {index}", 'Field Agent', '3 hours ago'] for index in range(50)],
+            'cards': [{'title': 'Total number of participants', 'content': '12,842'}],
+            'pagination_details': pagination_details,
+        }),
+        # /<module>/paginated/1/50 with whole documents
+        'paginated_documents': envelope({
+            'results': [participant(index, now, object_ids=False) for index in range(50)],
+            'pagination_details': pagination_details,
+        }),
+        # documents straight from MongoDB, ObjectId and datetime values included
+        'raw_documents': envelope([participant(index, now, object_ids=True) for index in range(50)]),
+        # /country/all_codes
+        'all_codes': [{'code': f"+{index}", 'country': f"Country {index}", 'abbreviation': f"C{index % 100:02d}",
+                       'currency': 'CUR'} for index in range(240)],
+    }
+
+
+def current_path(content) -> bytes:
+    return JSONResponse(jsonable_encoder(content, custom_encoder={ObjectId: str})).body
+
+
+def envelope_path(content) -> bytes:
+    return EnvelopeResponse(content).body
+
+
+def main(repetitions: int = 2000):
+    print(f"EnvelopeResponse {'with orjson ' + orjson.__version__ if orjson else 'without orjson'}, "
+          f"{repetitions} repetitions")
+    print(f"{'payload':<22}{'bytes':>9}{'current µs':>13}{'envelope µs':>14}{'speedup':>10}")
+    for name, content in payloads().items():
+        # both paths must produce the same document
+        assert json.loads(current_path(content)) == json.loads(envelope_path(content)), name
+        current = min(timeit.repeat(lambda: current_path(content), number=repetitions, repeat=5)) / repetitions
+        envelope_time = min(timeit.repeat(lambda: envelope_path(content), number=repetitions, repeat=5)) / repetitions
+        print(f"{name:<22}{len(envelope_path(content)):>9}{current * 1e6:>13.1f}{envelope_time * 1e6:>14.1f}"
+              f"{current / envelope_time:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)